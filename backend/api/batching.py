@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class BatchProcessor:
+    """Coalesce concurrent single-text requests into batched model calls"""
+
+    def __init__(self,
+                 batch_fn: Callable[[List[str]], List[Any]],
+                 max_batch_size: int = 32,
+                 max_wait_ms: int = 50,
+                 name: str = "batch"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background batching task on the running event loop"""
+        self.queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task, failing any requests still queued"""
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while self.queue and not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} processor stopped"))
+
+    async def submit(self, text: str) -> Any:
+        """Queue a single text and wait for its slice of the batched result"""
+        if self._worker is None:
+            raise RuntimeError(f"{self.name} processor is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        """Wait for the first item, then gather more until the batch is full or the window closes"""
+        loop = asyncio.get_running_loop()
+        items = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(items) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect_batch()
+            texts = [text for text, _ in items]
+
+            try:
+                # Model calls are blocking, keep them off the event loop
+                results = await asyncio.to_thread(self.batch_fn, texts)
+            except Exception as e:
+                logger.error(f"Error in {self.name} batch of {len(texts)}: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            if len(results) != len(items):
+                logger.error(f"{self.name} batch of {len(items)} returned {len(results)} results")
+
+            for (_, future), result in zip(items, results):
+                # Skip requests whose client has already gone away
+                if not future.done():
+                    future.set_result(result)
+
+            # Requests left without a result would otherwise wait forever
+            for _, future in items[len(results):]:
+                if not future.done():
+                    future.set_exception(
+                        RuntimeError(f"{self.name} batch returned no result for this request")
+                    )
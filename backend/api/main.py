@@ -1,49 +1,103 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Dict, Any, Optional
+import asyncio
 import logging
+import os
 from contextlib import asynccontextmanager
 
-from backend.ml_models.intent_classifier import IntentClassificationPipeline
+from backend.ml_models.intent_classifier import (
+    IntentClassificationPipeline, EmbeddingIntentClassifier, create_training_data
+)
 from backend.ml_models.ner_model import MOSDACNERModel, EntityRelationshipExtractor
-from backend.knowledge_graph.graph_builder import KnowledgeGraphBuilder, GraphQueryEngine
+from backend.knowledge_graph.graph_builder import KnowledgeGraphBuilder, GraphQueryEngine, MAX_RELATED_DEPTH
 from backend.rag.retrieval_system import RAGSystem
+from backend.api.batching import BatchProcessor
+from backend.cache import ResponseCache
 from backend.config import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Run through each model at startup so the first request does not pay for
+# lazy initialization or compilation
+WARMUP_QUERIES = [
+    "What satellite data products are available?",
+    "How do I download INSAT-3D imager data in HDF5 format?"
+]
+
 # Global model instances
 intent_classifier = None
 ner_model = None
+relationship_extractor = None
 graph_builder = None
 query_engine = None
 rag_system = None
+intent_batcher = None
+ner_batcher = None
+response_cache = None
+cache_watcher = None
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    global intent_classifier, ner_model, graph_builder, query_engine, rag_system
-    
-    logger.info("Loading ML models...")
-    
-    # Load intent classifier
-    intent_classifier = IntentClassificationPipeline()
+def load_intent_pipeline(device: Optional[str] = None) -> IntentClassificationPipeline:
+    """Load the transformer intent classifier, training a new one if none is saved"""
+    pipeline = IntentClassificationPipeline(
+        dtype=settings.INFERENCE_DTYPE,
+        device=device,
+        # ONNX export needs the unquantized torch weights
+        quantize=settings.QUANTIZE_INTENT_MODEL and not settings.INTENT_ONNX_PATH
+    )
     try:
-        intent_classifier.load_model(settings.INTENT_MODEL_PATH)
+        pipeline.load_model(settings.INTENT_MODEL_PATH)
         logger.info("Intent classifier loaded successfully")
     except Exception as e:
         logger.warning(f"Could not load intent classifier: {e}")
         # Train a new model if not found
-        df = intent_classifier.create_training_data()
-        train_dataset, val_dataset = intent_classifier.prepare_data(df)
-        intent_classifier.train_model(train_dataset, val_dataset)
+        df = pipeline.create_training_data()
+        pipeline.train_head(df, settings.INTENT_MODEL_PATH)
         logger.info("New intent classifier trained")
     
+    # Optionally serve the intent model from ONNX Runtime, exporting it on first use
+    if settings.INTENT_ONNX_PATH:
+        if not os.path.exists(settings.INTENT_ONNX_PATH):
+            if settings.QUANTIZE_INTENT_MODEL:
+                pipeline.to_onnx_int8(settings.INTENT_ONNX_PATH)
+            else:
+                pipeline.export_onnx(settings.INTENT_ONNX_PATH)
+        pipeline.load_onnx(settings.INTENT_ONNX_PATH)
+        logger.info(f"Intent classifier served from {settings.INTENT_ONNX_PATH}")
+    elif settings.COMPILE_MODELS:
+        pipeline.compile_model()
+    
+    return pipeline
+
+def load_models(device: Optional[str] = None):
+    """Load the ML models shared by every request handled in this process"""
+    global intent_classifier, ner_model, relationship_extractor, rag_system
+    
+    logger.info("Loading ML models...")
+    
+    # Initialize RAG system
+    rag_system = RAGSystem(
+        embedding_model=settings.EMBEDDING_MODEL,
+        embed_batch_size=settings.EMBED_BATCH_SIZE,
+        embedding_device=device,
+        embedding_dtype=settings.INFERENCE_DTYPE
+    )
+    
+    # Load intent classifier
+    if settings.INTENT_BACKEND == "embedding":
+        # Nearest-neighbour intents over the RAG embedding model, nothing to fine-tune
+        intent_classifier = EmbeddingIntentClassifier(embedder=rag_system.embeddings.client)
+        intent_classifier.fit(create_training_data())
+        logger.info("Embedding intent classifier built")
+    else:
+        intent_classifier = load_intent_pipeline(device)
+    
     # Load NER model
-    ner_model = MOSDACNERModel()
+    ner_model = MOSDACNERModel(batch_size=settings.NER_BATCH_SIZE)
     try:
         ner_model.load_model(settings.NER_MODEL_PATH)
         logger.info("NER model loaded successfully")
@@ -54,6 +108,44 @@ async def lifespan(app: FastAPI):
         ner_model.train_model(training_data)
         logger.info("New NER model trained")
     
+    relationship_extractor = EntityRelationshipExtractor(ner_model)
+    
+    intent_classifier.predict_intent_batch(WARMUP_QUERIES)
+    ner_model.extract_entities_batch(WARMUP_QUERIES)
+    
+    logger.info("All models loaded successfully")
+
+# Under gunicorn --preload the models are loaded once in the master and shared
+# copy-on-write with the forked workers. They stay on CPU so no CUDA context is
+# created before the fork.
+if os.environ.get("APP_PRELOAD"):
+    load_models(device="cpu")
+
+def load_entity_index():
+    """Load the entity ANN index written by the pipeline, if there is one"""
+    try:
+        if not query_engine.load_ann_index(rag_system.embeddings.client, settings.KG_INDEX_PATH):
+            logger.warning("No entity index found, using keyword graph search")
+    except Exception as e:
+        logger.warning(f"Could not load entity index, using keyword graph search: {e}")
+
+def on_graph_updated():
+    # The pipeline rewrites the entity index before announcing a new graph,
+    # and the old index points at node ids that no longer exist
+    graph_builder.clear_query_cache()
+    load_entity_index()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    global graph_builder, query_engine, intent_batcher, ner_batcher, response_cache, cache_watcher
+    
+    if intent_classifier is None:
+        load_models()
+    
+    # Connections, background tasks and the event loop are per worker and
+    # cannot be inherited across a fork, so they are created here
+    
     # Initialize knowledge graph
     graph_builder = KnowledgeGraphBuilder(
         neo4j_uri=settings.NEO4J_URI,
@@ -62,14 +154,46 @@ async def lifespan(app: FastAPI):
     )
     query_engine = GraphQueryEngine(graph_builder)
     
-    # Initialize RAG system
-    rag_system = RAGSystem()
+    # Entity ANN index shares the RAG embedding model. Only the pipeline builds
+    # it, workers just load the persisted copy.
+    load_entity_index()
     
-    logger.info("All models loaded successfully")
+    # Coalesce concurrent requests into batched forward passes
+    intent_batcher = BatchProcessor(
+        intent_classifier.predict_intent_batch,
+        max_batch_size=settings.BATCH_SIZE,
+        max_wait_ms=settings.BATCH_TIMEOUT_MS,
+        name="intent"
+    )
+    ner_batcher = BatchProcessor(
+        ner_model.extract_entities_batch,
+        max_batch_size=settings.BATCH_SIZE,
+        max_wait_ms=settings.BATCH_TIMEOUT_MS,
+        name="ner"
+    )
+    intent_batcher.start()
+    ner_batcher.start()
+    
+    # Response cache, invalidated whenever the pipeline rewrites the graph
+    response_cache = ResponseCache(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        ttl=settings.CACHE_TTL
+    )
+    cache_watcher = asyncio.create_task(
+        response_cache.watch_graph_updates(on_update=on_graph_updated)
+    )
+    
+    logger.info("Worker startup complete")
     
     yield
     
     # Shutdown
+    await intent_batcher.stop()
+    await ner_batcher.stop()
+    cache_watcher.cancel()
+    await response_cache.close()
     if graph_builder:
         graph_builder.close()
     logger.info("Application shutdown complete")
@@ -78,7 +202,8 @@ app = FastAPI(
     title="MOSDAC AI Help Bot API",
     description="AI-powered help bot for MOSDAC portal with knowledge graph and NLP capabilities",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -91,6 +216,35 @@ app.add_middleware(
 )
 
 # Pydantic models
+class Entity(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+    
+    text: str
+    label: str
+    start: int
+    end: int
+    confidence: float = 1.0
+
+class Relationship(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+    
+    subject: str
+    predicate: str
+    object: str
+    confidence: float = 1.0
+    source_text: str = ""
+
+class RelatedEntity(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+    
+    name: Optional[str] = None
+    type: Optional[str] = None
+    # Set by the entity index search
+    score: Optional[float] = None
+    # Set by graph traversal
+    distance: Optional[int] = None
+    relationship_path: Optional[List[str]] = None
+
 class QueryRequest(BaseModel):
     query: str
     context: Optional[Dict[str, Any]] = None
@@ -101,25 +255,25 @@ class QueryResponse(BaseModel):
     response: str
     intent: str
     confidence: float
-    entities: List[Dict[str, Any]]
-    relationships: List[Dict[str, Any]]
-    knowledge_graph_results: List[Dict[str, Any]]
+    entities: List[Entity]
+    relationships: List[Relationship]
+    knowledge_graph_results: List[RelatedEntity]
     sources: List[str]
 
 class EntityExtractionRequest(BaseModel):
     text: str
 
 class EntityExtractionResponse(BaseModel):
-    entities: List[Dict[str, Any]]
-    relationships: List[Dict[str, Any]]
+    entities: List[Entity]
+    relationships: List[Relationship]
 
 class KnowledgeGraphQuery(BaseModel):
     entity_name: str
-    max_depth: int = 2
+    max_depth: int = Field(default=2, ge=1, le=MAX_RELATED_DEPTH)
 
 class KnowledgeGraphResponse(BaseModel):
     entity_details: Dict[str, Any]
-    related_entities: List[Dict[str, Any]]
+    related_entities: List[RelatedEntity]
 
 # API endpoints
 @app.get("/")
@@ -138,35 +292,37 @@ async def health_check():
         }
     }
 
-@app.post("/query", response_model=QueryResponse)
+@app.post("/query", response_model=QueryResponse, response_model_exclude_unset=True)
 async def process_query(request: QueryRequest):
     """Process a user query and return comprehensive response"""
     try:
         query = request.query
         
-        # 1. Intent classification
-        intent, intent_confidence = intent_classifier.predict_intent(query)
-        logger.info(f"Intent: {intent} (confidence: {intent_confidence:.2f})")
-        
-        # 2. Entity extraction
-        entities = ner_model.extract_entities(query)
-        
-        # 3. Relationship extraction
-        relationship_extractor = EntityRelationshipExtractor(ner_model)
-        relationships = relationship_extractor.extract_relationships(query)
+        cache_key = ResponseCache.make_key("q", query, request.context)
+        cached = await response_cache.get(cache_key)
+        if cached:
+            return QueryResponse.model_validate_json(cached)
         
-        # 4. Knowledge graph search
-        kg_results = query_engine.semantic_search(query)
+        # 1-4. Intent classification, entity and relationship extraction and
+        # knowledge graph search are independent, so run them concurrently
+        (intent, intent_confidence), entities, relationships, kg_results = await asyncio.gather(
+            intent_batcher.submit(query),
+            ner_batcher.submit(query),
+            asyncio.to_thread(relationship_extractor.extract_relationships, query),
+            asyncio.to_thread(query_engine.semantic_search_ann, query)
+        )
+        logger.info(f"Intent: {intent} (confidence: {intent_confidence:.2f})")
         
         # 5. RAG-based response generation
-        rag_response = rag_system.generate_response(
+        rag_response = await asyncio.to_thread(
+            rag_system.generate_response,
             query=query,
             intent=intent,
             entities=entities,
             context=request.context
         )
         
-        return QueryResponse(
+        response = QueryResponse(
             response=rag_response["response"],
             intent=intent,
             confidence=intent_confidence,
@@ -175,43 +331,60 @@ async def process_query(request: QueryRequest):
             knowledge_graph_results=kg_results,
             sources=rag_response.get("sources", [])
         )
+        await response_cache.set(cache_key, response.model_dump_json(exclude_unset=True))
+        
+        return response
         
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/extract-entities", response_model=EntityExtractionResponse)
+@app.post("/extract-entities", response_model=EntityExtractionResponse, response_model_exclude_unset=True)
 async def extract_entities(request: EntityExtractionRequest):
     """Extract entities and relationships from text"""
     try:
-        entities = ner_model.extract_entities(request.text)
+        cache_key = ResponseCache.make_key("ents", request.text)
+        cached = await response_cache.get(cache_key)
+        if cached:
+            return EntityExtractionResponse.model_validate_json(cached)
+        
+        entities = await ner_batcher.submit(request.text)
         
-        relationship_extractor = EntityRelationshipExtractor(ner_model)
-        relationships = relationship_extractor.extract_relationships(request.text)
+        relationships = await asyncio.to_thread(relationship_extractor.extract_relationships, request.text)
         
-        return EntityExtractionResponse(
+        response = EntityExtractionResponse(
             entities=entities,
             relationships=relationships
         )
+        await response_cache.set(cache_key, response.model_dump_json(exclude_unset=True))
+        
+        return response
         
     except Exception as e:
         logger.error(f"Error extracting entities: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/knowledge-graph/query", response_model=KnowledgeGraphResponse)
+@app.post("/knowledge-graph/query", response_model=KnowledgeGraphResponse, response_model_exclude_unset=True)
 async def query_knowledge_graph(request: KnowledgeGraphQuery):
     """Query the knowledge graph for entity information"""
     try:
-        entity_details = graph_builder.get_entity_details(request.entity_name)
-        related_entities = graph_builder.find_related_entities(
-            request.entity_name, 
-            request.max_depth
+        cache_key = ResponseCache.make_key("kg", request.entity_name, request.max_depth)
+        cached = await response_cache.get(cache_key)
+        if cached:
+            return KnowledgeGraphResponse.model_validate_json(cached)
+        
+        entity_details, related_entities = await asyncio.gather(
+            asyncio.to_thread(graph_builder.get_entity_details, request.entity_name),
+            asyncio.to_thread(graph_builder.find_related_entities, request.entity_name, request.max_depth)
         )
         
-        return KnowledgeGraphResponse(
+        response = KnowledgeGraphResponse(
             entity_details=entity_details,
             related_entities=related_entities
         )
+        await response_cache.set(cache_key, response.model_dump_json(exclude_unset=True), ttl=settings.KG_CACHE_TTL)
+        
+        return response
         
     except Exception as e:
         logger.error(f"Error querying knowledge graph: {e}")
@@ -221,8 +394,8 @@ async def query_knowledge_graph(request: KnowledgeGraphQuery):
 async def export_knowledge_graph():
     """Export knowledge graph data for visualization"""
     try:
-        graph_data = graph_builder.export_graph_data()
-        return graph_data
+        content = await asyncio.to_thread(graph_builder.export_graph_json)
+        return Response(content=content, media_type="application/json")
         
     except Exception as e:
         logger.error(f"Error exporting knowledge graph: {e}")
@@ -267,11 +440,14 @@ async def get_query_type_distribution():
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     uvicorn.run(
         "backend.api.main:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
         workers=settings.API_WORKERS,
-        reload=True
+        # uvloop is not available on Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools"
     )
\ No newline at end of file
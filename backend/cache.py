@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Callable, Optional
+
+import redis
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Published by the pipeline whenever the knowledge graph is rewritten
+GRAPH_UPDATES_CHANNEL = "kg:updates"
+
+# Key prefixes whose cached responses depend on knowledge graph contents
+GRAPH_DEPENDENT_PREFIXES = ("q", "kg")
+
+class ResponseCache:
+    """Cache-aside store for serialized API responses backed by Redis"""
+
+    def __init__(self, host: str, port: int, db: int, ttl: int = 600):
+        self.redis = aioredis.Redis(host=host, port=port, db=db)
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(prefix: str, *parts: Any) -> str:
+        """Build a cache key from a hash of the normalized request parts"""
+        normalized = [
+            part.strip().lower() if isinstance(part, str) else part
+            for part in parts
+        ]
+        digest = hashlib.sha1(
+            json.dumps(normalized, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return f"{prefix}:{digest}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the cached payload, or None on a miss or Redis failure"""
+        try:
+            return await self.redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Cache read failed for {key}: {e}")
+            return None
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        """Store a payload, ignoring Redis failures"""
+        try:
+            await self.redis.set(key, value, ex=ttl or self.ttl)
+        except RedisError as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+
+    async def invalidate(self, *prefixes: str):
+        """Delete every cached entry under the given key prefixes"""
+        try:
+            for prefix in prefixes:
+                keys = [key async for key in self.redis.scan_iter(match=f"{prefix}:*", count=1000)]
+                if keys:
+                    await self.redis.delete(*keys)
+        except RedisError as e:
+            logger.warning(f"Cache invalidation failed: {e}")
+
+    async def watch_graph_updates(self, on_update: Optional[Callable[[], None]] = None):
+        """Invalidate graph-dependent entries whenever the graph is rewritten"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(GRAPH_UPDATES_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        logger.info("Knowledge graph updated, invalidating cached responses")
+                        await self.invalidate(*GRAPH_DEPENDENT_PREFIXES)
+                        if on_update:
+                            # Reloads read from disk, keep them off the event loop
+                            await asyncio.to_thread(on_update)
+            except RedisError as e:
+                logger.warning(f"Graph update listener disconnected: {e}")
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.reset()
+
+    async def close(self):
+        """Close the Redis connection pool"""
+        await self.redis.aclose()
+
+def notify_graph_updated(host: str, port: int, db: int):
+    """Tell API workers that cached graph results are stale"""
+    try:
+        client = redis.Redis(host=host, port=port, db=db)
+        client.publish(GRAPH_UPDATES_CHANNEL, "updated")
+        client.close()
+    except RedisError as e:
+        logger.warning(f"Could not publish graph update: {e}")
@@ -7,6 +7,8 @@ class Settings(BaseSettings):
     NEO4J_URI: str = "bolt://localhost:7687"
     NEO4J_USER: str = "neo4j"
     NEO4J_PASSWORD: str = "password"
+    # Rows per UNWIND transaction when writing the graph
+    NEO4J_BATCH_SIZE: int = 10000
     
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
@@ -17,30 +19,50 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
+    CACHE_TTL: int = 600
+    KG_CACHE_TTL: int = 300
     
     # Vector database
     CHROMA_PERSIST_DIRECTORY: str = "./data/chroma_db"
+    KG_INDEX_PATH: str = "./data/kg_index/entities.faiss"
+    EMBEDDING_CACHE_PATH: str = "./data/embedding_cache.sqlite3"
     
     # ML Model configurations
     INTENT_MODEL_PATH: str = "./models/intent_classifier"
     NER_MODEL_PATH: str = "./models/ner_model"
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBED_BATCH_SIZE: int = 32
+    NER_BATCH_SIZE: int = 64
+    NER_TRAIN_GPU: bool = False
     LLM_MODEL: str = "microsoft/DialoGPT-medium"
+    # "transformer" fine-tuned classifier or "embedding" nearest-neighbour classifier
+    INTENT_BACKEND: str = "transformer"
+    INFERENCE_DTYPE: str = "bfloat16"
+    COMPILE_MODELS: bool = False
+    QUANTIZE_INTENT_MODEL: bool = False
+    INTENT_ONNX_PATH: Optional[str] = None
     
     # Data paths
     DATA_DIR: str = "./data"
     SCRAPED_DATA_DIR: str = "./data/scraped"
     PROCESSED_DATA_DIR: str = "./data/processed"
+    TEST_CACHE_DIR: str = "./data/test_cache"
     
     # API settings
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
     API_WORKERS: int = 4
     
+    # Inference batching
+    BATCH_SIZE: int = 32
+    BATCH_TIMEOUT_MS: int = 50
+    
     # MOSDAC specific
     MOSDAC_BASE_URL: str = "https://www.mosdac.gov.in"
     CRAWL_DELAY: float = 1.0
     MAX_CONCURRENT_REQUESTS: int = 16
+    # Overlap up to MAX_CONCURRENT_REQUESTS requests to the MOSDAC host
+    CRAWL_AGGRESSIVE: bool = False
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,33 @@
+"""
+Gunicorn configuration for the MOSDAC AI Help Bot API
+
+Run with: gunicorn -c backend/gunicorn_conf.py backend.api.main:app
+"""
+
+import gc
+import os
+
+from backend.config import settings
+
+# Load the ML models once in the master before forking, see backend.api.main
+os.environ.setdefault("APP_PRELOAD", "1")
+
+# Tokenizer thread pools do not survive a fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+bind = f"{settings.API_HOST}:{settings.API_PORT}"
+workers = settings.API_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+def pre_fork(server, worker):
+    # Move preloaded objects out of the collector's reach so garbage
+    # collection in the workers does not dirty the shared pages
+    gc.freeze()
+
+def post_fork(server, worker):
+    import torch
+
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
@@ -1,13 +1,113 @@
-import networkx as nx
-from neo4j import GraphDatabase
+from neo4j import Driver, GraphDatabase
+from cachetools import TTLCache, cachedmethod
+from cachetools.keys import hashkey
+import faiss
+import numpy as np
+import orjson
+import io
 import json
-from typing import Dict, List, Any, Tuple
+import os
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count, islice
+from typing import BinaryIO, Dict, Iterable, List, Any, Optional, Tuple
 import logging
 from dataclasses import dataclass
+from functools import lru_cache
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Full-text index used for case-insensitive entity name lookups
+ENTITY_NAME_INDEX = "entity_name_fulltext"
+
+_NAME_TOKEN_RE = re.compile(r'\w+')
+
+def _name_search_query(entity_name: str) -> str:
+    """Build a Lucene query matching names that contain every word as a prefix"""
+    # Wildcard terms are not analyzed, so lowercase them like the index does
+    return " AND ".join(f"{token.lower()}*" for token in _NAME_TOKEN_RE.findall(entity_name))
+
+# Common words dropped by GraphQueryEngine.extract_key_terms
+_STOP_WORDS = frozenset({
+    "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by",
+    "is", "are", "was", "were", "what", "how", "where", "when", "why"
+})
+
+_WORD_RE = re.compile(r'\b\w+\b')
+
+# Deepest traversal find_related_entities will run
+MAX_RELATED_DEPTH = 5
+
+@lru_cache(maxsize=MAX_RELATED_DEPTH)
+def _related_entities_query(max_depth: int) -> str:
+    """Cypher for find_related_entities, with the depth inlined as a literal"""
+    # Path length bounds cannot be query parameters
+    return f"""
+    CALL db.index.fulltext.queryNodes('{ENTITY_NAME_INDEX}', $search) YIELD node AS start
+    MATCH path = (start)-[*1..{max_depth}]-(related:Entity)
+    RETURN DISTINCT related.name as name, 
+           related.type as type,
+           length(path) as distance,
+           [r in relationships(path) | type(r)] as relationship_path
+    ORDER BY distance, related.name
+    LIMIT 20
+    """
+
+# Drivers keyed on (uri, user), shared by every builder in the process
+_DRIVER_CACHE: Dict[Tuple[str, str], Driver] = {}
+_DRIVER_CACHE_LOCK = threading.Lock()
+
+def get_driver(uri: str, user: str, password: str,
+               max_connection_pool_size: int = 100,
+               connection_acquisition_timeout: float = 60,
+               max_connection_lifetime: float = 3600) -> Driver:
+    """Return the pooled driver for a database, creating it on first use"""
+    with _DRIVER_CACHE_LOCK:
+        driver = _DRIVER_CACHE.get((uri, user))
+        if driver is None:
+            driver = GraphDatabase.driver(
+                uri,
+                auth=(user, password),
+                max_connection_pool_size=max_connection_pool_size,
+                connection_acquisition_timeout=connection_acquisition_timeout,
+                max_connection_lifetime=max_connection_lifetime,
+                keep_alive=True
+            )
+            _DRIVER_CACHE[(uri, user)] = driver
+        return driver
+
+def close_driver(uri: str, user: str):
+    """Close and forget the pooled driver for a database"""
+    with _DRIVER_CACHE_LOCK:
+        driver = _DRIVER_CACHE.pop((uri, user), None)
+    if driver is not None:
+        driver.close()
+
+# Ids are a random per-process prefix plus a counter, so only one uuid4 is
+# generated per process instead of one per entity and relationship
+_ID_PREFIX = uuid.uuid4().hex
+_ID_COUNTER = count()
+
+def _new_id() -> str:
+    return f"{_ID_PREFIX}-{next(_ID_COUNTER):x}"
+
+def _reset_id_prefix():
+    # A forked child must not continue the parent's id sequence
+    global _ID_PREFIX, _ID_COUNTER
+    _ID_PREFIX = uuid.uuid4().hex
+    _ID_COUNTER = count()
+
+os.register_at_fork(after_in_child=_reset_id_prefix)
+
+def _chunked(iterable: Iterable, size: int):
+    """Yield successive lists of at most size items"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
 @dataclass
 class Entity:
     id: str
@@ -24,9 +124,32 @@ class Relationship:
     properties: Dict[str, Any]
 
 class KnowledgeGraphBuilder:
-    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str):
-        self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
-        self.graph = nx.MultiDiGraph()
+    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str,
+                 query_cache_size: int = 10000, query_cache_ttl: int = 300,
+                 max_connection_pool_size: int = 100,
+                 connection_acquisition_timeout: float = 60,
+                 max_connection_lifetime: float = 3600):
+        # Builders for the same database share one bounded connection pool
+        self.neo4j_uri = neo4j_uri
+        self.neo4j_user = neo4j_user
+        self.max_connection_pool_size = max_connection_pool_size
+        self.driver = get_driver(
+            neo4j_uri,
+            neo4j_user,
+            neo4j_password,
+            max_connection_pool_size=max_connection_pool_size,
+            connection_acquisition_timeout=connection_acquisition_timeout,
+            max_connection_lifetime=max_connection_lifetime
+        )
+        # Staging rows for save_to_neo4j and export_graph_data
+        self._nodes: List[Dict[str, Any]] = []
+        self._edges: List[Dict[str, Any]] = []
+        
+        # Entity lookups change only when the graph is rewritten
+        self._query_cache = TTLCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+        self._query_cache_lock = threading.Lock()
+        
+        self.create_indexes()
         
         # Entity type mappings
         self.entity_types = {
@@ -43,7 +166,7 @@ class KnowledgeGraphBuilder:
     
     def create_entity(self, text: str, entity_type: str, properties: Dict[str, Any] = None) -> Entity:
         """Create an entity node"""
-        entity_id = str(uuid.uuid4())
+        entity_id = _new_id()
         
         if properties is None:
             properties = {}
@@ -67,7 +190,7 @@ class KnowledgeGraphBuilder:
     def create_relationship(self, source_entity: Entity, target_entity: Entity, 
                           relation_type: str, properties: Dict[str, Any] = None) -> Relationship:
         """Create a relationship between entities"""
-        rel_id = str(uuid.uuid4())
+        rel_id = _new_id()
         
         if properties is None:
             properties = {}
@@ -83,23 +206,24 @@ class KnowledgeGraphBuilder:
         return relationship
     
     def add_entity_to_graph(self, entity: Entity):
-        """Add entity to NetworkX graph"""
-        self.graph.add_node(
-            entity.id,
-            label=entity.label,
-            type=entity.type,
-            **entity.properties
-        )
+        """Stage entity for writing to Neo4j"""
+        self._nodes.append({
+            **entity.properties,
+            'id': entity.id,
+            'label': entity.label,
+            # create_entity maps the NER label to the graph type, e.g. Mission
+            'type': entity.properties.get('type', entity.type)
+        })
     
     def add_relationship_to_graph(self, relationship: Relationship):
-        """Add relationship to NetworkX graph"""
-        self.graph.add_edge(
-            relationship.source_id,
-            relationship.target_id,
-            id=relationship.id,
-            type=relationship.type,
-            **relationship.properties
-        )
+        """Stage relationship for writing to Neo4j"""
+        self._edges.append({
+            **relationship.properties,
+            'source_id': relationship.source_id,
+            'target_id': relationship.target_id,
+            'id': relationship.id,
+            'type': relationship.type
+        })
     
     def build_graph_from_entities(self, entities_data: List[Dict[str, Any]], 
                                  relationships_data: List[Dict[str, Any]]):
@@ -111,84 +235,131 @@ class KnowledgeGraphBuilder:
             entity = self.create_entity(
                 text=entity_data["text"],
                 entity_type=entity_data["label"],
-                properties=entity_data.get("properties", {})
+                properties={
+                    **entity_data.get("properties", {}),
+                    "frequency": entity_data.get("frequency", 1)
+                }
             )
             
             self.add_entity_to_graph(entity)
-            entity_map[entity_data["text"].lower()] = entity
+            entity_map[entity_data["text"].casefold()] = entity
         
         # Create relationships
         for rel_data in relationships_data:
-            subject_text = rel_data["subject"].lower()
-            object_text = rel_data["object"].lower()
+            source_entity = entity_map.get(rel_data["subject"].casefold())
+            target_entity = entity_map.get(rel_data["object"].casefold())
             
-            if subject_text in entity_map and object_text in entity_map:
-                source_entity = entity_map[subject_text]
-                target_entity = entity_map[object_text]
-                
+            if source_entity and target_entity:
                 relationship = self.create_relationship(
                     source_entity=source_entity,
                     target_entity=target_entity,
                     relation_type=rel_data["predicate"],
                     properties={
                         "confidence": rel_data.get("confidence", 1.0),
-                        "source_text": rel_data.get("source_text", "")
+                        "source_text": rel_data.get("source_text", ""),
+                        "frequency": rel_data.get("frequency", 1)
                     }
                 )
                 
                 self.add_relationship_to_graph(relationship)
     
-    def save_to_neo4j(self):
+    def create_indexes(self):
+        """Create the indexes used by entity writes and name lookups"""
+        try:
+            with self.driver.session() as session:
+                session.run("CREATE INDEX entity_id IF NOT EXISTS FOR (n:Entity) ON (n.id)").consume()
+                session.run(
+                    f"CREATE FULLTEXT INDEX {ENTITY_NAME_INDEX} IF NOT EXISTS "
+                    "FOR (n:Entity) ON EACH [n.name]"
+                ).consume()
+        except Exception as e:
+            logger.warning(f"Could not create Neo4j indexes: {e}")
+    
+    def clear_query_cache(self):
+        """Drop cached entity lookups after the graph changes"""
+        with self._query_cache_lock:
+            self._query_cache.clear()
+    
+    def save_to_neo4j(self, batch_size: int = 1000, max_workers: int = 8):
         """Save the knowledge graph to Neo4j database"""
-        with self.driver.session() as session:
-            # Clear existing data
-            session.run("MATCH (n) DETACH DELETE n")
+        self.clear_query_cache()
+        
+        # Clear existing data
+        self._run_batch(lambda tx: tx.run("MATCH (n) DETACH DELETE n").consume())
+        
+        # Leave a couple of pooled connections free for queries
+        workers = max(1, min(self.max_connection_pool_size - 2, max_workers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Create entities, one transaction per batch of rows
+            node_rows = (
+                {
+                    "id": node["id"],
+                    "props": {
+                        **{k: v for k, v in node.items() if k not in ['label', 'type']},
+                        "label": node.get("label", ""),
+                        "type": node.get("type", ""),
+                        "name": node.get("name", node.get("label", ""))
+                    }
+                }
+                for node in self._nodes
+            )
+            list(executor.map(
+                lambda rows: self._run_batch(self._write_entities, rows),
+                _chunked(node_rows, batch_size)
+            ))
             
-            # Create entities
-            for node_id, node_data in self.graph.nodes(data=True):
-                query = """
-                CREATE (n:Entity {
-                    id: $id,
-                    label: $label,
-                    type: $type,
-                    name: $name
-                })
-                SET n += $properties
-                """
-                
-                properties = {k: v for k, v in node_data.items() 
-                            if k not in ['label', 'type']}
-                
-                session.run(query, {
-                    "id": node_id,
-                    "label": node_data.get("label", ""),
-                    "type": node_data.get("type", ""),
-                    "name": node_data.get("name", node_data.get("label", "")),
-                    "properties": properties
+            # Relationship types cannot be parameterized, so group rows by type
+            rows_by_type = defaultdict(list)
+            for edge in self._edges:
+                rel_id = edge.get("id") or _new_id()
+                rows_by_type[edge.get('type', 'RELATED')].append({
+                    "source_id": edge["source_id"],
+                    "target_id": edge["target_id"],
+                    "id": rel_id,
+                    "props": {
+                        **{k: v for k, v in edge.items()
+                           if k not in ['type', 'id', 'source_id', 'target_id']},
+                        "id": rel_id,
+                        "confidence": edge.get("confidence", 1.0)
+                    }
                 })
             
-            # Create relationships
-            for source, target, edge_data in self.graph.edges(data=True):
-                query = f"""
-                MATCH (a:Entity {{id: $source_id}})
-                MATCH (b:Entity {{id: $target_id}})
-                CREATE (a)-[r:{edge_data.get('type', 'RELATED')} {{
-                    id: $rel_id,
-                    confidence: $confidence
-                }}]->(b)
-                SET r += $properties
-                """
-                
-                properties = {k: v for k, v in edge_data.items() 
-                            if k not in ['type', 'id']}
-                
-                session.run(query, {
-                    "source_id": source,
-                    "target_id": target,
-                    "rel_id": edge_data.get("id", str(uuid.uuid4())),
-                    "confidence": edge_data.get("confidence", 1.0),
-                    "properties": properties
-                })
+            # Relationships match on their endpoints, so they start only
+            # after every entity batch has been committed
+            list(executor.map(
+                lambda batch: self._run_batch(self._write_relationships, *batch),
+                (
+                    (rel_type, rows)
+                    for rel_type, type_rows in rows_by_type.items()
+                    for rows in _chunked(type_rows, batch_size)
+                )
+            ))
+    
+    def _run_batch(self, work, *args):
+        # Each batch runs in its own session so batches can be written from
+        # several threads; execute_write retries TransientError, which covers
+        # deadlocks between concurrent MERGEs on shared nodes
+        with self.driver.session() as session:
+            session.execute_write(work, *args)
+    
+    @staticmethod
+    def _write_entities(tx, rows: List[Dict[str, Any]]):
+        tx.run("""
+        UNWIND $rows AS row
+        MERGE (n:Entity {id: row.id})
+        ON CREATE SET n = row.props
+        ON MATCH SET n += row.props
+        """, rows=rows).consume()
+    
+    @staticmethod
+    def _write_relationships(tx, rel_type: str, rows: List[Dict[str, Any]]):
+        tx.run(f"""
+        UNWIND $rows AS row
+        MATCH (a:Entity {{id: row.source_id}})
+        MATCH (b:Entity {{id: row.target_id}})
+        MERGE (a)-[r:`{rel_type}` {{id: row.id}}]->(b)
+        SET r += row.props
+        """, rows=rows).consume()
     
     def query_graph(self, query: str) -> List[Dict[str, Any]]:
         """Query the knowledge graph"""
@@ -196,32 +367,35 @@ class KnowledgeGraphBuilder:
             result = session.run(query)
             return [record.data() for record in result]
     
+    @cachedmethod(lambda self: self._query_cache,
+                  key=lambda self, *args, **kwargs: hashkey("related", *args, **kwargs),
+                  lock=lambda self: self._query_cache_lock)
     def find_related_entities(self, entity_name: str, max_depth: int = 2) -> List[Dict[str, Any]]:
         """Find entities related to a given entity"""
-        query = """
-        MATCH (start:Entity)
-        WHERE toLower(start.name) CONTAINS toLower($entity_name)
-        MATCH path = (start)-[*1..$max_depth]-(related:Entity)
-        RETURN DISTINCT related.name as name, 
-               related.type as type,
-               length(path) as distance,
-               [r in relationships(path) | type(r)] as relationship_path
-        ORDER BY distance, related.name
-        LIMIT 20
-        """
+        if not isinstance(max_depth, int) or not 1 <= max_depth <= MAX_RELATED_DEPTH:
+            raise ValueError(f"max_depth must be an integer between 1 and {MAX_RELATED_DEPTH}")
+        
+        search = _name_search_query(entity_name)
+        if not search:
+            return []
         
         with self.driver.session() as session:
-            result = session.run(query, {
-                "entity_name": entity_name,
-                "max_depth": max_depth
-            })
+            result = session.run(_related_entities_query(max_depth), {"search": search})
             return [record.data() for record in result]
     
+    @cachedmethod(lambda self: self._query_cache,
+                  key=lambda self, *args, **kwargs: hashkey("details", *args, **kwargs),
+                  lock=lambda self: self._query_cache_lock)
     def get_entity_details(self, entity_name: str) -> Dict[str, Any]:
         """Get detailed information about an entity"""
-        query = """
-        MATCH (e:Entity)
-        WHERE toLower(e.name) CONTAINS toLower($entity_name)
+        search = _name_search_query(entity_name)
+        if not search:
+            return {}
+        
+        # Describe the best-scoring name match only
+        query = f"""
+        CALL db.index.fulltext.queryNodes('{ENTITY_NAME_INDEX}', $search) YIELD node AS e, score
+        WITH e ORDER BY score DESC LIMIT 1
         OPTIONAL MATCH (e)-[r]-(related:Entity)
         RETURN e.name as name,
                e.type as type,
@@ -231,93 +405,221 @@ class KnowledgeGraphBuilder:
                    relationship: type(r),
                    direction: CASE WHEN startNode(r) = e THEN 'outgoing' ELSE 'incoming' END
                }) as relationships
-        LIMIT 1
         """
         
         with self.driver.session() as session:
-            result = session.run(query, {"entity_name": entity_name})
+            result = session.run(query, {"search": search})
             record = result.single()
             return record.data() if record else {}
     
-    def export_graph_data(self) -> Dict[str, Any]:
-        """Export graph data for visualization"""
-        nodes = []
-        edges = []
-        
-        # Export nodes
-        for node_id, node_data in self.graph.nodes(data=True):
-            nodes.append({
-                "id": node_id,
-                "label": node_data.get("label", ""),
-                "type": node_data.get("type", ""),
-                "properties": {k: v for k, v in node_data.items() 
-                             if k not in ['label', 'type']}
-            })
+    def export_graph_data(self, fp: BinaryIO):
+        """Stream graph data for visualization to a binary file as JSON"""
+        node_types = set()
+        relationship_types = set()
+        
+        # Export nodes, collecting type stats in the same pass
+        fp.write(b'{"nodes": [')
+        node_count = 0
+        for node in self._nodes:
+            node_type = node.get("type", "")
+            node_types.add(node_type)
+            if node_count:
+                fp.write(b', ')
+            fp.write(orjson.dumps({
+                "id": node["id"],
+                "label": node.get("label", ""),
+                "type": node_type,
+                "properties": {k: v for k, v in node.items() 
+                             if k not in ['id', 'label', 'type']}
+            }, option=orjson.OPT_SERIALIZE_NUMPY))
+            node_count += 1
         
         # Export edges
-        for source, target, edge_data in self.graph.edges(data=True):
-            edges.append({
-                "source": source,
-                "target": target,
-                "type": edge_data.get("type", "RELATED"),
-                "properties": {k: v for k, v in edge_data.items() 
-                             if k not in ['type']}
-            })
+        fp.write(b'], "edges": [')
+        edge_count = 0
+        for edge in self._edges:
+            edge_type = edge.get("type", "RELATED")
+            relationship_types.add(edge_type)
+            if edge_count:
+                fp.write(b', ')
+            fp.write(orjson.dumps({
+                "source": edge["source_id"],
+                "target": edge["target_id"],
+                "type": edge_type,
+                "properties": {k: v for k, v in edge.items() 
+                             if k not in ['type', 'source_id', 'target_id']}
+            }, option=orjson.OPT_SERIALIZE_NUMPY))
+            edge_count += 1
         
-        return {
-            "nodes": nodes,
-            "edges": edges,
-            "stats": {
-                "node_count": len(nodes),
-                "edge_count": len(edges),
-                "node_types": list(set(node["type"] for node in nodes)),
-                "relationship_types": list(set(edge["type"] for edge in edges))
-            }
-        }
+        fp.write(b'], "stats": ')
+        fp.write(orjson.dumps({
+            "node_count": node_count,
+            "edge_count": edge_count,
+            "node_types": list(node_types),
+            "relationship_types": list(relationship_types)
+        }))
+        fp.write(b'}')
+    
+    def export_graph_json(self) -> bytes:
+        """Serialize graph data for visualization to JSON bytes"""
+        buffer = io.BytesIO()
+        self.export_graph_data(buffer)
+        return buffer.getvalue()
     
     def close(self):
-        """Close database connection"""
-        self.driver.close()
+        """Close the shared database connection pool"""
+        close_driver(self.neo4j_uri, self.neo4j_user)
 
 class GraphQueryEngine:
     def __init__(self, graph_builder: KnowledgeGraphBuilder):
         self.graph_builder = graph_builder
+        
+        # Entity name ANN index and the entity id of each row, swapped as one
+        # pair so searches never mix an old index with new ids
+        self.embedder = None
+        self._ann: Optional[Tuple[Any, List[str]]] = None
+    
+    def load_ann_index(self, embedder, index_path: str) -> bool:
+        """Load the persisted entity index, returning False if there is none"""
+        self.embedder = embedder
+        ids_path = f"{index_path}.ids.json"
+        if not (os.path.exists(index_path) and os.path.exists(ids_path)):
+            return False
+        
+        # Memory-map the persisted index instead of reading it into each process
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+        with open(ids_path, 'r') as f:
+            ids = json.load(f)
+        
+        # The two files are replaced one after the other, so a load that lands
+        # between the replacements sees them out of step
+        if index.ntotal != len(ids):
+            logger.warning(f"Entity index at {index_path} does not match its id list, not loading it")
+            return False
+        
+        self._ann = (index, ids)
+        logger.info(f"Loaded entity index with {len(ids)} entries from {index_path}")
+        return True
+    
+    def build_ann_index(self, embedder, index_path: str, batch_size: int = 256, rebuild: bool = False):
+        """Load or build an HNSW index over entity name embeddings"""
+        if not rebuild and self.load_ann_index(embedder, index_path):
+            return
+        self.embedder = embedder
+        
+        rows = self.graph_builder.query_graph(
+            "MATCH (n:Entity) WHERE n.name IS NOT NULL RETURN n.id as id, n.name as name"
+        )
+        if not rows:
+            logger.warning("No entities in the knowledge graph, skipping entity index")
+            # A stale index would point at entities that are gone
+            for path in (index_path, f"{index_path}.ids.json"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._ann = None
+            return
+        
+        embeddings = embedder.encode(
+            [row["name"] for row in rows],
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        ).astype(np.float32)
+        
+        # Inner product over normalized vectors ranks by cosine similarity
+        index = faiss.IndexHNSWFlat(embeddings.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        index.add(embeddings)
+        
+        ids = [row["id"] for row in rows]
+        
+        # Write to temporary files and rename them into place, so readers never
+        # see a partially written index
+        os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+        ids_path = f"{index_path}.ids.json"
+        tmp_suffix = f".{os.getpid()}.tmp"
+        faiss.write_index(index, index_path + tmp_suffix)
+        with open(ids_path + tmp_suffix, 'w') as f:
+            json.dump(ids, f)
+        os.replace(ids_path + tmp_suffix, ids_path)
+        os.replace(index_path + tmp_suffix, index_path)
+        
+        self._ann = (index, ids)
+        logger.info(f"Built entity index with {len(rows)} entries at {index_path}")
+    
+    def semantic_search_ann(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Find the entities whose names are nearest to the query embedding"""
+        ann = self._ann
+        if ann is None:
+            return self.semantic_search(query, limit)
+        ann_index, ann_ids = ann
+        
+        query_embedding = self.embedder.encode(
+            [query], normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+        scores, positions = ann_index.search(query_embedding, limit)
+        
+        hits = [(ann_ids[pos], float(score)) for pos, score in zip(positions[0], scores[0]) if pos >= 0]
+        if not hits:
+            return []
+        
+        # Fetch all matched entities in one round trip
+        query = """
+        UNWIND $ids AS entity_id
+        MATCH (n:Entity {id: entity_id})
+        RETURN n.id as id, n.name as name, n.type as type
+        """
+        with self.graph_builder.driver.session() as session:
+            result = session.run(query, {"ids": [entity_id for entity_id, _ in hits]})
+            records = {record["id"]: record.data() for record in result}
+        
+        results = []
+        for entity_id, score in hits:
+            record = records.get(entity_id)
+            if record:
+                results.append({
+                    "name": record["name"],
+                    "type": record["type"],
+                    "score": score
+                })
+        
+        return results
     
     def semantic_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Perform semantic search on the knowledge graph"""
         # Extract key terms from query
         key_terms = self.extract_key_terms(query)
+        if not key_terms:
+            return []
         
-        results = []
-        for term in key_terms:
-            related_entities = self.graph_builder.find_related_entities(term)
-            results.extend(related_entities)
-        
-        # Remove duplicates and rank by relevance
-        unique_results = {}
-        for result in results:
-            key = result["name"]
-            if key not in unique_results:
-                unique_results[key] = result
-            else:
-                # Merge results, keeping the one with shorter distance
-                if result["distance"] < unique_results[key]["distance"]:
-                    unique_results[key] = result
-        
-        return list(unique_results.values())[:limit]
+        # Look up every term in one round trip, keeping each related entity's
+        # shortest path across all terms
+        query = f"""
+        UNWIND $terms AS term
+        CALL db.index.fulltext.queryNodes('{ENTITY_NAME_INDEX}', term) YIELD node AS start
+        MATCH path = (start)-[*1..2]-(related:Entity)
+        WITH related, path
+        ORDER BY length(path)
+        WITH related, collect(path)[0] AS path
+        RETURN related.name as name,
+               related.type as type,
+               length(path) as distance,
+               [r in relationships(path) | type(r)] as relationship_path
+        ORDER BY distance, name
+        LIMIT $limit
+        """
+        
+        with self.graph_builder.driver.session() as session:
+            result = session.run(query, {
+                "terms": [_name_search_query(term) for term in key_terms],
+                "limit": limit
+            })
+            return [record.data() for record in result]
     
     def extract_key_terms(self, query: str) -> List[str]:
         """Extract key terms from query for graph search"""
         # Simple keyword extraction - in production, use more sophisticated NLP
-        import re
-        
-        # Remove common words
-        stop_words = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by", "is", "are", "was", "were", "what", "how", "where", "when", "why"}
-        
-        words = re.findall(r'\b\w+\b', query.lower())
-        key_terms = [word for word in words if word not in stop_words and len(word) > 2]
-        
-        return key_terms
+        return [word for word in _WORD_RE.findall(query.lower())
+                if len(word) > 2 and word not in _STOP_WORDS]
 
 if __name__ == "__main__":
     # Example usage
@@ -1,14 +1,103 @@
 import torch
 import torch.nn as nn
-from transformers import AutoTokenizer, AutoModel, Trainer, TrainingArguments
+from transformers import AutoTokenizer, AutoModel
 from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
 import pandas as pd
 import numpy as np
 from typing import List, Dict, Tuple
+from collections import Counter
+from contextlib import contextmanager
+from cachetools import LRUCache
+import threading
+import hashlib
 import json
 import os
 
+def create_training_data() -> pd.DataFrame:
+    """Create synthetic training data for MOSDAC intents"""
+    training_examples = [
+        # Product Information
+        ("What satellite data products are available?", "product_information"),
+        ("Tell me about INSAT-3D imager data", "product_information"),
+        ("What is the resolution of Oceansat-2 data?", "product_information"),
+        ("List all available satellite missions", "product_information"),
+        ("What sensors are available on SCATSAT-1?", "product_information"),
+        
+        # Data Download
+        ("How do I download satellite data?", "data_download"),
+        ("What is the procedure for data access?", "data_download"),
+        ("I need to download INSAT-3D data for my research", "data_download"),
+        ("Can you help me access ocean color data?", "data_download"),
+        ("Where can I find the download links?", "data_download"),
+        
+        # Technical Support
+        ("I'm having trouble accessing my account", "technical_support"),
+        ("The download is not working", "technical_support"),
+        ("Error in data processing", "technical_support"),
+        ("Website is not loading properly", "technical_support"),
+        ("I need help with data format conversion", "technical_support"),
+        
+        # Mission Details
+        ("Tell me about INSAT-3D mission", "mission_details"),
+        ("What is the orbit of Oceansat-2?", "mission_details"),
+        ("When was SCATSAT-1 launched?", "mission_details"),
+        ("Mission objectives of Indian satellites", "mission_details"),
+        ("Satellite constellation information", "mission_details"),
+        
+        # Geospatial Query
+        ("Data available for Indian Ocean region", "geospatial_query"),
+        ("Satellite coverage for Mumbai area", "geospatial_query"),
+        ("What data covers latitude 20N longitude 75E?", "geospatial_query"),
+        ("Regional data availability", "geospatial_query"),
+        ("Spatial resolution for my area of interest", "geospatial_query"),
+        
+        # Documentation
+        ("Where is the user manual?", "documentation_request"),
+        ("I need technical documentation", "documentation_request"),
+        ("API documentation link", "documentation_request"),
+        ("Product specification sheets", "documentation_request"),
+        ("Training materials for beginners", "documentation_request"),
+        
+        # API Usage
+        ("How to use the API?", "api_usage"),
+        ("API key generation", "api_usage"),
+        ("Bulk data access through API", "api_usage"),
+        ("API rate limits", "api_usage"),
+        ("Authentication for API calls", "api_usage"),
+        
+        # Account Management
+        ("How to create an account?", "account_management"),
+        ("Forgot my password", "account_management"),
+        ("Update my profile information", "account_management"),
+        ("Account verification process", "account_management"),
+        ("Delete my account", "account_management"),
+        
+        # Data Processing
+        ("How to process satellite data?", "data_processing"),
+        ("Data calibration procedures", "data_processing"),
+        ("Atmospheric correction methods", "data_processing"),
+        ("Image enhancement techniques", "data_processing"),
+        ("Quality assessment of data", "data_processing"),
+        
+        # General Inquiry
+        ("What is MOSDAC?", "general_inquiry"),
+        ("About Indian Space Research Organisation", "general_inquiry"),
+        ("Contact information", "general_inquiry"),
+        ("Latest news and updates", "general_inquiry"),
+        ("How can I contribute?", "general_inquiry")
+    ]
+    
+    # Expand with variations
+    expanded_examples = []
+    for text, intent in training_examples:
+        expanded_examples.append((text, intent))
+        # Add variations
+        expanded_examples.append((text.lower(), intent))
+        expanded_examples.append((text + "?", intent))
+        expanded_examples.append((f"Can you help me with {text.lower()}", intent))
+    
+    return pd.DataFrame(expanded_examples, columns=['text', 'intent'])
+
 class IntentClassifier(nn.Module):
     def __init__(self, model_name: str, num_classes: int, dropout_rate: float = 0.3):
         super().__init__()
@@ -16,19 +105,33 @@ class IntentClassifier(nn.Module):
         self.dropout = nn.Dropout(dropout_rate)
         self.classifier = nn.Linear(self.bert.config.hidden_size, num_classes)
         
-    def forward(self, input_ids, attention_mask):
+    def encode(self, input_ids, attention_mask):
+        """Sentence features fed to the classifier head"""
         outputs = self.bert(input_ids=input_ids, attention_mask=attention_mask)
-        pooled_output = outputs.pooler_output
-        output = self.dropout(pooled_output)
+        # DistilBERT has no pooler, fall back to the [CLS] hidden state
+        if getattr(outputs, 'pooler_output', None) is not None:
+            return outputs.pooler_output
+        return outputs.last_hidden_state[:, 0]
+    
+    def forward(self, input_ids, attention_mask):
+        output = self.dropout(self.encode(input_ids, attention_mask))
         return self.classifier(output)
 
 class IntentClassificationPipeline:
-    def __init__(self, model_name: str = "distilbert-base-uncased"):
+    def __init__(self, model_name: str = "distilbert-base-uncased", dtype: str = "float32", device: str = None,
+                 quantize: bool = False, cache_size: int = 4096):
         self.model_name = model_name
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.label_encoder = LabelEncoder()
         self.model = None
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.dtype = self._resolve_dtype(dtype)
+        self.quantize = quantize
+        self.ort_session = None
+        
+        # Chat traffic repeats the same questions, so remember recent predictions
+        self._prediction_cache = LRUCache(maxsize=cache_size)
+        self._prediction_cache_lock = threading.Lock()
         
         # MOSDAC-specific intent categories
         self.intent_categories = [
@@ -46,136 +149,103 @@ class IntentClassificationPipeline:
     
     def create_training_data(self) -> pd.DataFrame:
         """Create synthetic training data for MOSDAC intents"""
-        training_examples = [
-            # Product Information
-            ("What satellite data products are available?", "product_information"),
-            ("Tell me about INSAT-3D imager data", "product_information"),
-            ("What is the resolution of Oceansat-2 data?", "product_information"),
-            ("List all available satellite missions", "product_information"),
-            ("What sensors are available on SCATSAT-1?", "product_information"),
-            
-            # Data Download
-            ("How do I download satellite data?", "data_download"),
-            ("What is the procedure for data access?", "data_download"),
-            ("I need to download INSAT-3D data for my research", "data_download"),
-            ("Can you help me access ocean color data?", "data_download"),
-            ("Where can I find the download links?", "data_download"),
-            
-            # Technical Support
-            ("I'm having trouble accessing my account", "technical_support"),
-            ("The download is not working", "technical_support"),
-            ("Error in data processing", "technical_support"),
-            ("Website is not loading properly", "technical_support"),
-            ("I need help with data format conversion", "technical_support"),
-            
-            # Mission Details
-            ("Tell me about INSAT-3D mission", "mission_details"),
-            ("What is the orbit of Oceansat-2?", "mission_details"),
-            ("When was SCATSAT-1 launched?", "mission_details"),
-            ("Mission objectives of Indian satellites", "mission_details"),
-            ("Satellite constellation information", "mission_details"),
-            
-            # Geospatial Query
-            ("Data available for Indian Ocean region", "geospatial_query"),
-            ("Satellite coverage for Mumbai area", "geospatial_query"),
-            ("What data covers latitude 20N longitude 75E?", "geospatial_query"),
-            ("Regional data availability", "geospatial_query"),
-            ("Spatial resolution for my area of interest", "geospatial_query"),
-            
-            # Documentation
-            ("Where is the user manual?", "documentation_request"),
-            ("I need technical documentation", "documentation_request"),
-            ("API documentation link", "documentation_request"),
-            ("Product specification sheets", "documentation_request"),
-            ("Training materials for beginners", "documentation_request"),
-            
-            # API Usage
-            ("How to use the API?", "api_usage"),
-            ("API key generation", "api_usage"),
-            ("Bulk data access through API", "api_usage"),
-            ("API rate limits", "api_usage"),
-            ("Authentication for API calls", "api_usage"),
-            
-            # Account Management
-            ("How to create an account?", "account_management"),
-            ("Forgot my password", "account_management"),
-            ("Update my profile information", "account_management"),
-            ("Account verification process", "account_management"),
-            ("Delete my account", "account_management"),
-            
-            # Data Processing
-            ("How to process satellite data?", "data_processing"),
-            ("Data calibration procedures", "data_processing"),
-            ("Atmospheric correction methods", "data_processing"),
-            ("Image enhancement techniques", "data_processing"),
-            ("Quality assessment of data", "data_processing"),
-            
-            # General Inquiry
-            ("What is MOSDAC?", "general_inquiry"),
-            ("About Indian Space Research Organisation", "general_inquiry"),
-            ("Contact information", "general_inquiry"),
-            ("Latest news and updates", "general_inquiry"),
-            ("How can I contribute?", "general_inquiry")
-        ]
+        return create_training_data()
+    
+    def _resolve_dtype(self, dtype: str) -> torch.dtype:
+        """Map a dtype name to a torch dtype usable on the current device"""
+        torch_dtype = getattr(torch, dtype)
         
-        # Expand with variations
-        expanded_examples = []
-        for text, intent in training_examples:
-            expanded_examples.append((text, intent))
-            # Add variations
-            expanded_examples.append((text.lower(), intent))
-            expanded_examples.append((text + "?", intent))
-            expanded_examples.append(f"Can you help me with {text.lower()}", intent)
-        
-        return pd.DataFrame(expanded_examples, columns=['text', 'intent'])
-    
-    def prepare_data(self, df: pd.DataFrame) -> Tuple[torch.utils.data.Dataset, torch.utils.data.Dataset]:
-        """Prepare data for training"""
-        # Encode labels
-        df['label'] = self.label_encoder.fit_transform(df['intent'])
-        
-        # Split data
-        train_texts, val_texts, train_labels, val_labels = train_test_split(
-            df['text'].tolist(), df['label'].tolist(), test_size=0.2, random_state=42
-        )
+        # fp16 matmuls are only fast on GPU, use bf16 on CPU instead
+        if torch_dtype == torch.float16 and self.device.type == "cpu":
+            return torch.bfloat16
+        
+        return torch_dtype
+    
+    @contextmanager
+    def inference_mode(self):
+        """Run without autograd bookkeeping, autocasting to the inference dtype"""
+        with torch.inference_mode(), torch.autocast(
+            device_type=self.device.type,
+            dtype=self.dtype,
+            enabled=self.dtype != torch.float32
+        ):
+            yield
+    
+    def precompute_features(self, texts: List[str], batch_size: int = 64, cache_dir: str = None) -> np.ndarray:
+        """Encode texts once with the frozen encoder, optionally caching the features on disk"""
+        cache_path = None
+        if cache_dir:
+            digest = hashlib.sha1("\n".join(texts).encode("utf-8")).hexdigest()[:12]
+            cache_path = os.path.join(cache_dir, f"features-{self.model_name.replace('/', '_')}-{digest}.npy")
+            if os.path.exists(cache_path):
+                return np.load(cache_path)
+        
+        self.model.eval()
         
-        # Tokenize
-        train_encodings = self.tokenizer(train_texts, truncation=True, padding=True, max_length=128)
-        val_encodings = self.tokenizer(val_texts, truncation=True, padding=True, max_length=128)
+        # Each batch is padded only to its own longest text, so batch texts of
+        # similar length together and put the features back in input order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = []
+        for start in range(0, len(order), batch_size):
+            encoding = self.tokenizer(
+                [texts[i] for i in order[start:start + batch_size]],
+                truncation=True,
+                padding=True,
+                max_length=128,
+                pad_to_multiple_of=8 if self.device.type == "cuda" else None,
+                return_tensors='pt'
+            ).to(self.device)
+            with self.inference_mode():
+                batches.append(self.model.encode(**encoding).float().cpu().numpy())
+        sorted_features = np.concatenate(batches)
+        features = np.empty_like(sorted_features)
+        features[order] = sorted_features
         
-        # Create datasets
-        train_dataset = IntentDataset(train_encodings, train_labels)
-        val_dataset = IntentDataset(val_encodings, val_labels)
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(cache_path, features)
         
-        return train_dataset, val_dataset
+        return features
     
-    def train_model(self, train_dataset, val_dataset, output_dir: str = "./models/intent_classifier"):
-        """Train the intent classification model"""
+    def train_head(self, df: pd.DataFrame, output_dir: str = "./models/intent_classifier",
+                   epochs: int = 200, learning_rate: float = 1e-2):
+        """Train only the classifier head on features from the frozen encoder"""
+        labels = self.label_encoder.fit_transform(df['intent'])
         num_classes = len(self.label_encoder.classes_)
-        self.model = IntentClassifier(self.model_name, num_classes)
         
-        training_args = TrainingArguments(
-            output_dir=output_dir,
-            num_train_epochs=3,
-            per_device_train_batch_size=16,
-            per_device_eval_batch_size=16,
-            warmup_steps=500,
-            weight_decay=0.01,
-            logging_dir=f'{output_dir}/logs',
-            evaluation_strategy="epoch",
-            save_strategy="epoch",
-            load_best_model_at_end=True,
-        )
+        self.model = IntentClassifier(self.model_name, num_classes).to(self.device)
+        for param in self.model.bert.parameters():
+            param.requires_grad = False
+        
+        # The encoder runs once over the corpus instead of on every step
+        features = torch.from_numpy(
+            self.precompute_features(df['text'].tolist(), cache_dir=output_dir)
+        ).to(self.device)
+        targets = torch.as_tensor(labels, device=self.device)
         
-        trainer = Trainer(
-            model=self.model,
-            args=training_args,
-            train_dataset=train_dataset,
-            eval_dataset=val_dataset,
+        # TF32 matmuls and the fused AdamW kernel where training runs on the GPU
+        use_cuda = self.device.type == "cuda"
+        if use_cuda:
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+        
+        head = self.model.classifier
+        optimizer = torch.optim.AdamW(
+            head.parameters(), lr=learning_rate, weight_decay=0.01, fused=use_cuda
         )
+        loss_fn = nn.CrossEntropyLoss()
+        
+        self.model.train()
+        for _ in range(epochs):
+            optimizer.zero_grad()
+            loss = loss_fn(head(self.model.dropout(features)), targets)
+            loss.backward()
+            optimizer.step()
+        self.model.eval()
+        self.clear_prediction_cache()
         
-        trainer.train()
-        trainer.save_model()
+        os.makedirs(output_dir, exist_ok=True)
+        torch.save(self.model.state_dict(), f"{output_dir}/pytorch_model.bin")
         
         # Save label encoder
         import joblib
@@ -183,48 +253,214 @@ class IntentClassificationPipeline:
         
         # Save tokenizer
         self.tokenizer.save_pretrained(output_dir)
+        
+        return float(loss)
     
     def predict_intent(self, text: str) -> Tuple[str, float]:
         """Predict intent for a given text"""
-        if self.model is None:
+        return self.predict_intent_batch([text])[0]
+
+    def predict_intent_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Predict intents for several texts with a single padded forward pass"""
+        if self.model is None and self.ort_session is None:
             raise ValueError("Model not trained or loaded")
-        
+
+        if not texts:
+            return []
+
+        keys = [text.strip().lower() for text in texts]
+        with self._prediction_cache_lock:
+            results = {key: self._prediction_cache[key] for key in keys if key in self._prediction_cache}
+
+        misses = [key for key in dict.fromkeys(keys) if key not in results]
+        if misses:
+            predictions = dict(zip(misses, self._predict_uncached(misses)))
+            with self._prediction_cache_lock:
+                self._prediction_cache.update(predictions)
+            results.update(predictions)
+
+        return [results[key] for key in keys]
+
+    def _predict_uncached(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Run one batch through the model"""
+        if self.ort_session is not None:
+            return self._predict_intent_batch_onnx(texts)
+
         self.model.eval()
-        encoding = self.tokenizer(text, truncation=True, padding=True, max_length=128, return_tensors='pt')
-        
-        with torch.no_grad():
-            outputs = self.model(**encoding)
-            predictions = torch.nn.functional.softmax(outputs, dim=-1)
-            predicted_class = torch.argmax(predictions, dim=-1).item()
-            confidence = predictions[0][predicted_class].item()
-        
-        intent = self.label_encoder.inverse_transform([predicted_class])[0]
-        return intent, confidence
-    
+        encoding = self.tokenizer(
+            texts,
+            truncation=True,
+            padding=True,
+            max_length=128,
+            pad_to_multiple_of=8 if self.device.type == "cuda" else None,
+            return_tensors='pt'
+        )
+        encoding = encoding.to(self.device)
+
+        with self.inference_mode():
+            logits = self.model(**encoding).float()
+            # argmax of the logits is the argmax of the softmax, and the winning
+            # probability is exp(max - logsumexp) without normalizing every class
+            max_logits, predicted_classes = torch.max(logits, dim=-1)
+            confidences = torch.exp(max_logits - torch.logsumexp(logits, dim=-1))
+
+        intents = self.label_encoder.inverse_transform(predicted_classes.cpu().numpy())
+        return list(zip(intents.tolist(), confidences.cpu().tolist()))
+
+    def _predict_intent_batch_onnx(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Run a batch through the ONNX Runtime session"""
+        encoding = self.tokenizer(texts, truncation=True, padding=True, max_length=128, return_tensors='np')
+        logits = self.ort_session.run(['logits'], {
+            'input_ids': encoding['input_ids'].astype(np.int64),
+            'attention_mask': encoding['attention_mask'].astype(np.int64)
+        })[0]
+
+        # Softmax probability of the winning class only, stable against overflow
+        max_logits = logits.max(axis=-1, keepdims=True)
+        confidences = 1.0 / np.exp(logits - max_logits).sum(axis=-1)
+
+        intents = self.label_encoder.inverse_transform(logits.argmax(axis=-1))
+        return list(zip(intents.tolist(), confidences.tolist()))
+
     def load_model(self, model_path: str):
         """Load trained model"""
         import joblib
         
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
         self.label_encoder = joblib.load(f"{model_path}/label_encoder.pkl")
+        self.clear_prediction_cache()
         
         num_classes = len(self.label_encoder.classes_)
         self.model = IntentClassifier(self.model_name, num_classes)
         self.model.load_state_dict(torch.load(f"{model_path}/pytorch_model.bin", map_location=self.device))
-        self.model.to(self.device)
+        
+        if self.quantize and self.device.type == "cpu":
+            # Dynamic INT8 linear layers take float32 activations, so skip autocast
+            self.dtype = torch.float32
+            self.model = torch.quantization.quantize_dynamic(self.model, {nn.Linear}, dtype=torch.qint8)
+        
+        self.model.to(device=self.device, dtype=self.dtype)
+        self.model.eval()
+    
+    def export_onnx(self, output_path: str, opset_version: int = 17) -> str:
+        """Export the model to ONNX with dynamic batch and sequence axes"""
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        
+        # Export from a float32 copy on CPU, quantized weights cannot be copied back
+        num_classes = len(self.label_encoder.classes_)
+        model = IntentClassifier(self.model_name, num_classes)
+        model.load_state_dict({k: v.float() for k, v in self.model.state_dict().items()})
+        model.eval()
+        
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        dummy = self.tokenizer(["What satellite data is available?"], return_tensors='pt')
+        torch.onnx.export(
+            model,
+            (dummy['input_ids'], dummy['attention_mask']),
+            output_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'logits': {0: 'batch'}
+            },
+            opset_version=opset_version
+        )
+        
+        return output_path
+    
+    def to_onnx_int8(self, output_path: str, opset_version: int = 17) -> str:
+        """Export the model to ONNX with INT8 weights for ONNX Runtime"""
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        
+        fp32_path = self.export_onnx(f"{os.path.splitext(output_path)[0]}.fp32.onnx", opset_version)
+        quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+        return output_path
+    
+    def load_onnx(self, onnx_path: str):
+        """Serve predictions from an exported ONNX model through ONNX Runtime"""
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.ort_session = ort.InferenceSession(
+            onnx_path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.clear_prediction_cache()
+    
+    def clear_prediction_cache(self):
+        """Forget cached predictions after the model changes"""
+        with self._prediction_cache_lock:
+            self._prediction_cache.clear()
+    
+    def compile_model(self):
+        """Compile the loaded model with torch.compile for fused inference kernels"""
+        if self.model is None:
+            raise ValueError("Model not trained or loaded")
+        
+        # CUDA graphs only pay off on GPU, and padded batch lengths vary per call
+        mode = "reduce-overhead" if self.device.type == "cuda" else "default"
+        self.model = torch.compile(self.model, mode=mode, dynamic=True)
 
-class IntentDataset(torch.utils.data.Dataset):
-    def __init__(self, encodings, labels):
-        self.encodings = encodings
-        self.labels = labels
+class EmbeddingIntentClassifier:
+    """Classify intents by majority vote over the nearest labelled examples"""
     
-    def __getitem__(self, idx):
-        item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
-        item['labels'] = torch.tensor(self.labels[idx])
-        return item
+    def __init__(self, embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 k: int = 5, embedder=None, batch_size: int = 64):
+        if embedder is None:
+            from sentence_transformers import SentenceTransformer
+            embedder = SentenceTransformer(embedding_model)
+        
+        self.embedder = embedder
+        self.k = k
+        self.batch_size = batch_size
+        self.index = None
+        self.labels = None
     
-    def __len__(self):
-        return len(self.labels)
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.embedder.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+    
+    def fit(self, df: pd.DataFrame):
+        """Embed every labelled example into an exact inner product index"""
+        import faiss
+        
+        embeddings = self._encode(df['text'].tolist())
+        self.index = faiss.IndexFlatIP(embeddings.shape[1])
+        self.index.add(embeddings)
+        self.labels = df['intent'].to_numpy()
+    
+    def predict_intent(self, text: str) -> Tuple[str, float]:
+        """Predict intent for a given text"""
+        return self.predict_intent_batch([text])[0]
+    
+    def predict_intent_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Predict intents for several texts with one encode and one index search"""
+        if self.index is None:
+            raise ValueError("Model not trained or loaded")
+        
+        if not texts:
+            return []
+        
+        scores, neighbours = self.index.search(self._encode(texts), min(self.k, self.index.ntotal))
+        
+        results = []
+        for row_scores, row_neighbours in zip(scores, neighbours):
+            neighbour_labels = self.labels[row_neighbours]
+            intent = Counter(neighbour_labels).most_common(1)[0][0]
+            # Confidence is the similarity of the closest example with the winning label
+            confidence = float(row_scores[neighbour_labels == intent].max())
+            results.append((str(intent), confidence))
+        
+        return results
 
 if __name__ == "__main__":
     # Train the intent classifier
@@ -234,9 +470,6 @@ if __name__ == "__main__":
     df = pipeline.create_training_data()
     print(f"Created {len(df)} training examples")
     
-    # Prepare data
-    train_dataset, val_dataset = pipeline.prepare_data(df)
-    
-    # Train model
-    pipeline.train_model(train_dataset, val_dataset)
+    # Train the classifier head on frozen encoder features
+    pipeline.train_head(df)
     print("Intent classifier training completed!")
\ No newline at end of file
@@ -1,14 +1,53 @@
 import spacy
 from spacy.training import Example
 from spacy.util import minibatch, compounding
-import random
-from typing import List, Dict, Tuple, Any
+import numpy as np
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Any, Optional
 import json
 import os
 
+# Optional, lets the relationship extractor skip patterns that cannot match
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Only doc.ents is consumed, so these components never need to run
+UNUSED_PIPES = ["tagger", "parser", "attribute_ruler", "lemmatizer"]
+
+# Closed MOSDAC vocabulary matched exactly by an entity ruler ahead of the
+# statistical NER, which is left with the open-ended labels
+MOSDAC_ENTITY_TERMS = {
+    "SATELLITE": ["INSAT-3D", "INSAT-3DR", "Oceansat-2", "Oceansat-3", "SCATSAT-1",
+                  "Megha-Tropiques", "SARAL", "Kalpana-1"],
+    "SENSOR": ["Imager", "Sounder", "OCM", "Scatterometer", "SAPHIR", "MADRAS", "AltiKa"],
+    "FORMAT": ["HDF5", "HDF", "NetCDF", "GeoTIFF"],
+    "ORGANIZATION": ["ISRO", "MOSDAC", "SAC"],
+}
+
+@dataclass
+class EntityBatch:
+    """Entities of one text as parallel arrays, labels as indices into label_names"""
+    texts: List[str]
+    labels: np.ndarray       # int16
+    starts: np.ndarray       # int32 character offsets
+    ends: np.ndarray         # int32 character offsets
+    confidences: np.ndarray  # float32
+    label_names: List[str]
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+
 class MOSDACNERModel:
-    def __init__(self, model_name: str = "en_core_web_sm"):
-        self.nlp = spacy.load(model_name)
+    def __init__(self, model_name: str = "en_core_web_sm", batch_size: int = 64):
+        self.model_name = model_name
+        self.nlp = spacy.load(model_name, disable=UNUSED_PIPES)
+        # Texts per minibatch in extract_entities_batch
+        self.batch_size = batch_size
         
         # Add custom entity labels for MOSDAC domain
         self.entity_labels = [
@@ -24,11 +63,37 @@ class MOSDACNERModel:
             "DATE_RANGE"      # Time periods
         ]
         
-        # Add labels to NER component
+        self._add_labels()
+        self._add_entity_ruler()
+        
+        # Integer label encoding for EntityBatch, grown as new labels are seen
+        self.label_names: List[str] = []
+        self._label_ids: Dict[str, int] = {}
+        self._label_ids_lock = threading.Lock()
+    
+    def _add_labels(self):
+        """Add labels to NER component"""
         ner = self.nlp.get_pipe("ner")
         for label in self.entity_labels:
             ner.add_label(label)
     
+    def _add_entity_ruler(self):
+        """Match the closed MOSDAC vocabulary before the statistical NER"""
+        # A model saved after training already carries its ruler
+        if "entity_ruler" in self.nlp.pipe_names:
+            return
+        
+        ruler = self.nlp.add_pipe(
+            "entity_ruler",
+            before="ner",
+            config={"overwrite_ents": True, "phrase_matcher_attr": "LOWER"}
+        )
+        ruler.add_patterns([
+            {"label": label, "pattern": term}
+            for label, terms in MOSDAC_ENTITY_TERMS.items()
+            for term in terms
+        ])
+    
     def create_training_data(self) -> List[Tuple[str, Dict[str, List[Tuple[int, int, str]]]]]:
         """Create training data for MOSDAC-specific entities"""
         training_data = [
@@ -126,28 +191,36 @@ class MOSDACNERModel:
         
         return extended_data
     
-    def train_model(self, training_data: List[Tuple[str, Dict]], n_iter: int = 30, output_dir: str = "./models/ner_model"):
+    def train_model(self, training_data: List[Tuple[str, Dict]], n_iter: int = 30, output_dir: str = "./models/ner_model",
+                    use_gpu: bool = False):
         """Train the NER model"""
+        if use_gpu:
+            # Components allocate their weights when the pipeline is loaded, so
+            # reload it after switching thinc to CuPy. The small CNN tok2vec in
+            # en_core_web_sm gains much less from this than transformer pipelines.
+            spacy.require_gpu()
+            self.nlp = spacy.load(self.model_name, disable=UNUSED_PIPES)
+            self._add_labels()
+            self._add_entity_ruler()
+        
         # Disable other pipes during training
-        other_pipes = [pipe for pipe in self.nlp.pipe_names if pipe != "ner"]
-        with self.nlp.disable_pipes(*other_pipes):
+        with self.nlp.select_pipes(enable=["ner"]):
             
-            # Create training examples
-            examples = []
-            for text, annotations in training_data:
-                doc = self.nlp.make_doc(text)
-                example = Example.from_dict(doc, annotations)
-                examples.append(example)
+            # Create training examples, tokenizing all texts in one pass
+            examples = self._make_examples(training_data)
             
-            # Training loop
+            # Training loop, shuffling an index array instead of the examples
             optimizer = self.nlp.resume_training()
+            rng = np.random.default_rng()
+            idx = np.arange(len(examples))
             for i in range(n_iter):
-                random.shuffle(examples)
+                rng.shuffle(idx)
                 losses = {}
                 
                 # Batch training
-                batches = minibatch(examples, size=compounding(4.0, 32.0, 1.001))
-                for batch in batches:
+                batches = minibatch(idx, size=compounding(4.0, 32.0, 1.001))
+                for batch_idx in batches:
+                    batch = [examples[j] for j in batch_idx]
                     self.nlp.update(batch, sgd=optimizer, losses=losses)
                 
                 if i % 10 == 0:
@@ -158,11 +231,66 @@ class MOSDACNERModel:
         self.nlp.to_disk(output_dir)
         print(f"Model saved to {output_dir}")
     
+    def _make_examples(self, data: List[Tuple[str, Dict]]) -> List[Example]:
+        """Build examples from (text, annotations) pairs with batched tokenization"""
+        texts, annotations = zip(*data)
+        docs = self.nlp.tokenizer.pipe(texts)
+        return [Example.from_dict(doc, annots) for doc, annots in zip(docs, annotations)]
+    
     def extract_entities(self, text: str) -> List[Dict[str, Any]]:
         """Extract entities from text"""
-        doc = self.nlp(text)
-        entities = []
+        return self._doc_entities(self.nlp(text))
+
+    def extract_entities_batch(self, texts: List[str], batch_size: Optional[int] = None,
+                               n_process: int = 1) -> List[List[Dict[str, Any]]]:
+        """Extract entities from several texts in one batched pipeline pass"""
+        docs = self.nlp.pipe(texts, batch_size=batch_size or self.batch_size, n_process=n_process)
+        return [self._doc_entities(doc) for doc in docs]
+
+    def extract_entities_soa_batch(self, texts: List[str], batch_size: Optional[int] = None,
+                                   n_process: int = 1) -> List[EntityBatch]:
+        """Extract entities from several texts as parallel arrays per text"""
+        docs = self.nlp.pipe(texts, batch_size=batch_size or self.batch_size, n_process=n_process)
+        return [self._doc_entity_batch(doc) for doc in docs]
+    
+    def _label_id(self, label: str) -> int:
+        label_id = self._label_ids.get(label)
+        if label_id is None:
+            with self._label_ids_lock:
+                label_id = self._label_ids.get(label)
+                if label_id is None:
+                    label_id = len(self.label_names)
+                    self.label_names.append(label)
+                    self._label_ids[label] = label_id
+        return label_id
+    
+    def _doc_entity_batch(self, doc) -> EntityBatch:
+        """Convert the entities of a processed doc to an EntityBatch"""
+        ents = doc.ents
+        labels = np.empty(len(ents), dtype=np.int16)
+        starts = np.empty(len(ents), dtype=np.int32)
+        ends = np.empty(len(ents), dtype=np.int32)
+        confidences = np.empty(len(ents), dtype=np.float32)
         
+        for i, ent in enumerate(ents):
+            labels[i] = self._label_id(ent.label_)
+            starts[i] = ent.start_char
+            ends[i] = ent.end_char
+            confidences[i] = getattr(ent, 'confidence', 1.0)
+        
+        return EntityBatch(
+            texts=[ent.text for ent in ents],
+            labels=labels,
+            starts=starts,
+            ends=ends,
+            confidences=confidences,
+            label_names=self.label_names
+        )
+    
+    def _doc_entities(self, doc) -> List[Dict[str, Any]]:
+        """Convert the entities of a processed doc to plain dicts"""
+        entities = []
+
         for ent in doc.ents:
             entities.append({
                 "text": ent.text,
@@ -176,15 +304,13 @@ class MOSDACNERModel:
     
     def load_model(self, model_path: str):
         """Load trained model"""
-        self.nlp = spacy.load(model_path)
+        self.model_name = model_path
+        self.nlp = spacy.load(model_path, disable=UNUSED_PIPES)
+        self._add_entity_ruler()
     
     def evaluate_model(self, test_data: List[Tuple[str, Dict]]) -> Dict[str, float]:
         """Evaluate model performance"""
-        examples = []
-        for text, annotations in test_data:
-            doc = self.nlp.make_doc(text)
-            example = Example.from_dict(doc, annotations)
-            examples.append(example)
+        examples = self._make_examples(test_data)
         
         scores = self.nlp.evaluate(examples)
         return {
@@ -197,36 +323,91 @@ class EntityRelationshipExtractor:
     def __init__(self, ner_model: MOSDACNERModel):
         self.ner_model = ner_model
         
-        # Define relationship patterns
+        # Define relationship patterns, each with the words any match must contain
         self.relationship_patterns = [
             # Satellite -> provides -> Data Product
             {"pattern": r"(\w+)\s+(provides|generates|produces)\s+(.+)", 
-             "relation": "PROVIDES"},
+             "relation": "PROVIDES",
+             "anchors": ["provides", "generates", "produces"]},
             
             # Sensor -> measures -> Parameter
             {"pattern": r"(\w+)\s+(measures|captures|monitors)\s+(.+)",
-             "relation": "MEASURES"},
+             "relation": "MEASURES",
+             "anchors": ["measures", "captures", "monitors"]},
              
             # Data -> covers -> Location
             {"pattern": r"(.+)\s+(covers|over|for)\s+(.+)",
-             "relation": "COVERS"},
+             "relation": "COVERS",
+             "anchors": ["covers", "over", "for"]},
              
             # Data -> available in -> Format
             {"pattern": r"(.+)\s+(in|format)\s+(\w+)\s+format",
-             "relation": "FORMAT"},
+             "relation": "FORMAT",
+             "anchors": ["format"]},
+        ]
+        self._compiled = [
+            (re.compile(p["pattern"], re.IGNORECASE), p["relation"])
+            for p in self.relationship_patterns
         ]
+        self._prefilter = self._build_prefilter()
+        self._prefilter_lock = threading.Lock()
+        
+        # Without Hyperscan, one pass over the anchor words narrows the patterns.
+        # Longer anchors go first so "format" is not consumed as "for".
+        self._anchor_patterns = defaultdict(set)
+        for i, p in enumerate(self.relationship_patterns):
+            for anchor in p["anchors"]:
+                self._anchor_patterns[anchor].add(i)
+        self._anchor_re = re.compile(
+            "|".join(map(re.escape, sorted(self._anchor_patterns, key=len, reverse=True))),
+            re.IGNORECASE
+        )
+    
+    def _build_prefilter(self):
+        """Compile all patterns into one Hyperscan database, if available"""
+        if hyperscan is None:
+            return None
+        
+        # UTF8/UCP keep \w and . consistent with Python's str patterns
+        flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH |
+                 hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP)
+        database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        database.compile(
+            expressions=[p["pattern"].encode("utf-8") for p in self.relationship_patterns],
+            ids=list(range(len(self.relationship_patterns))),
+            elements=len(self.relationship_patterns),
+            flags=[flags] * len(self.relationship_patterns)
+        )
+        return database
+    
+    def _candidate_patterns(self, text: str):
+        """Return the compiled patterns that match somewhere in text"""
+        if self._prefilter is None:
+            found = set()
+            for match in self._anchor_re.finditer(text):
+                found.update(self._anchor_patterns.get(match.group(0).casefold(), ()))
+                if len(found) == len(self._compiled):
+                    break
+            return [self._compiled[i] for i in sorted(found)]
+        
+        # One linear scan finds which patterns match at all, then only those
+        # are run with re to extract the capture groups
+        matched_ids = set()
+        def on_match(pattern_id, start, end, flags, context):
+            matched_ids.add(pattern_id)
+        
+        # The database's scratch space cannot be shared between threads
+        with self._prefilter_lock:
+            self._prefilter.scan(text.encode("utf-8"), match_event_handler=on_match)
+        return [self._compiled[i] for i in sorted(matched_ids)]
     
     def extract_relationships(self, text: str) -> List[Dict[str, Any]]:
         """Extract entity relationships from text"""
-        entities = self.ner_model.extract_entities(text)
+        # Relationships come from the patterns alone, so NER is never run here
         relationships = []
         
-        import re
-        for pattern_info in self.relationship_patterns:
-            pattern = pattern_info["pattern"]
-            relation_type = pattern_info["relation"]
-            
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+        for pattern, relation_type in self._candidate_patterns(text):
+            matches = pattern.finditer(text)
             for match in matches:
                 subject = match.group(1).strip()
                 object_text = match.group(3).strip()
@@ -5,28 +5,166 @@ from langchain.document_loaders import JSONLoader, PyPDFLoader
 from langchain.llms import HuggingFacePipeline
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
+from langchain.schema import Document
 import chromadb
-from typing import List, Dict, Any, Optional
+from cachetools import LRUCache, cachedmethod
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import orjson
+import torch
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
 import os
-import json
 import logging
+import multiprocessing
+import re
+import sqlite3
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Chunks are encoded and written in batches of this size, persisting every
+# few batches, so only one batch of vectors is held in memory at a time
+CHROMA_ADD_BATCH_SIZE = 256
+CHROMA_PERSIST_EVERY = 8
+
+# HNSW parameters for the chunk collection. Embeddings are normalized, so
+# cosine distance ranks the same as inner product. Only applied when the
+# collection is first created.
+CHROMA_COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64
+}
+
+# Chunks whose SimHashes differ in at most this many bits count as duplicates
+SIMHASH_MAX_DISTANCE = 3
+_SIMHASH_TOKEN_RE = re.compile(r"\w+")
+
+def _simhash64(text: str) -> int:
+    """64-bit SimHash over the word tokens of text"""
+    weights = [0] * 64
+    for token, count in Counter(_SIMHASH_TOKEN_RE.findall(text.lower())).items():
+        token_hash = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            weights[bit] += count if token_hash >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+def _drop_near_duplicates(texts: List[Any], max_distance: int = SIMHASH_MAX_DISTANCE) -> List[Any]:
+    """Keep the first of each group of chunks with near-identical SimHashes"""
+    # With 4 bands of 16 bits, hashes within 3 bits agree on at least one band,
+    # so only hashes sharing a band need to be compared
+    bands = [defaultdict(list) for _ in range(4)]
+    kept = []
+    for text in texts:
+        simhash = _simhash64(text.page_content)
+        keys = [simhash >> (16 * i) & 0xFFFF for i in range(4)]
+        if any((simhash ^ other).bit_count() <= max_distance
+               for band, key in zip(bands, keys) for other in band.get(key, ())):
+            continue
+        for band, key in zip(bands, keys):
+            band[key].append(simhash)
+        kept.append(text)
+    return kept
+
+def _file_sha1(path: str) -> str:
+    """Hash a file's contents without reading it into memory at once"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _chunk_id(chunk: Any) -> str:
+    """Stable id for a chunk derived from its text and metadata"""
+    digest = hashlib.sha1(orjson.dumps(chunk.metadata, option=orjson.OPT_SORT_KEYS))
+    digest.update(chunk.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+class SqliteEmbedCache:
+    """Chunk embeddings on disk keyed by a SHA-256 of the model and chunk text"""
+    
+    # Stay under SQLite's limit on bound parameters per statement
+    _LOOKUP_BATCH_SIZE = 500
+    
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+    
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors for whichever keys are present"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self._LOOKUP_BATCH_SIZE):
+                batch = keys[start:start + self._LOOKUP_BATCH_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+    
+    def put_many(self, items: List[Tuple[str, np.ndarray]]):
+        """Store vectors as float32 blobs"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+    
+    def close(self):
+        self.conn.close()
+
+def _load_pdf(path: str) -> List[Any]:
+    """Parse a PDF into documents, runs in a worker process"""
+    return PyPDFLoader(path).load()
+
 class RAGSystem:
     def __init__(self, 
                  embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
-                 persist_directory: str = "./data/chroma_db"):
+                 persist_directory: str = "./data/chroma_db",
+                 embed_batch_size: int = 32,
+                 embedding_device: Optional[str] = None,
+                 embedding_dtype: str = "float32",
+                 query_cache_size: int = 1024):
         
         self.embedding_model = embedding_model
         self.persist_directory = persist_directory
+        self.embed_batch_size = embed_batch_size
+        self.embedding_device = embedding_device or ('cuda' if torch.cuda.is_available() else 'cpu')
         
-        # Initialize embeddings
+        # fp16 matmuls are only fast on GPU, use bf16 on CPU instead
+        if embedding_dtype == "float16" and self.embedding_device == 'cpu':
+            embedding_dtype = "bfloat16"
+        self.embedding_dtype = getattr(torch, embedding_dtype)
+        
+        # Initialize embeddings, chunks are encoded in batches of embed_batch_size
         self.embeddings = HuggingFaceEmbeddings(
             model_name=embedding_model,
-            model_kwargs={'device': 'cpu'}
+            model_kwargs={
+                'device': self.embedding_device,
+                'model_kwargs': {'torch_dtype': self.embedding_dtype}
+            },
+            encode_kwargs={'batch_size': embed_batch_size, 'normalize_embeddings': True}
         )
         
+        # Common questions repeat, so remember recent query embeddings
+        self._query_embedding_cache = LRUCache(maxsize=query_cache_size)
+        self._query_embedding_cache_lock = threading.Lock()
+        
+        # Optional SqliteEmbedCache consulted before encoding ingested chunks
+        self.embedding_cache = None
+        
         # Initialize vector store
         self.vectorstore = None
         self.retriever = None
@@ -119,7 +257,8 @@ class RAGSystem:
             # Try to load existing vector store
             self.vectorstore = Chroma(
                 persist_directory=self.persist_directory,
-                embedding_function=self.embeddings
+                embedding_function=self.embeddings,
+                collection_metadata=CHROMA_COLLECTION_METADATA
             )
             
             # Check if vector store has documents
@@ -138,7 +277,8 @@ class RAGSystem:
             # Create new vector store
             self.vectorstore = Chroma(
                 persist_directory=self.persist_directory,
-                embedding_function=self.embeddings
+                embedding_function=self.embeddings,
+                collection_metadata=CHROMA_COLLECTION_METADATA
             )
     
     def ingest_documents(self, data_directory: str):
@@ -146,55 +286,195 @@ class RAGSystem:
         if not self.vectorstore:
             self.initialize_vectorstore()
         
-        documents = []
+        # Files unchanged since the last ingest are skipped. An empty collection
+        # means the store was reset, so everything is ingested again.
+        if self.vectorstore._collection.count():
+            cache = self._load_ingest_cache()
+        else:
+            cache = {}
+        directory = os.path.abspath(data_directory)
+        present = set()
         
-        # Process JSON files (scraped web content)
-        json_files = [f for f in os.listdir(data_directory) if f.endswith('.json')]
+        # Bucket the changed directory entries by type in a single scan
+        json_files, jsonl_files, pdf_files = [], [], []
+        file_stats = {}
+        with os.scandir(data_directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(('.json', '.jsonl', '.pdf')):
+                    continue
+                path = os.path.abspath(entry.path)
+                present.add(path)
+                stat = entry.stat()
+                cached = cache.get(path)
+                if cached and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                    continue
+                
+                # Touched but identical files only need their stat refreshed
+                sha1 = _file_sha1(path)
+                if cached and cached["sha1"] == sha1:
+                    cached.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                    continue
+                file_stats[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": sha1}
+                
+                if entry.name.endswith('.json'):
+                    json_files.append(entry)
+                elif entry.name.endswith('.jsonl'):
+                    jsonl_files.append(entry)
+                else:
+                    pdf_files.append(entry)
+        
+        documents_by_file = {}
         
+        # Process JSON files (scraped web content)
         for json_file in json_files:
-            file_path = os.path.join(data_directory, json_file)
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                with open(json_file.path, 'rb') as f:
+                    data = orjson.loads(f.read())
                 
                 # Extract content based on data structure
+                documents = []
                 if isinstance(data, dict):
-                    content = self.extract_content_from_json(data)
-                    if content:
-                        documents.extend(content)
+                    documents = self.extract_content_from_json(data)
+                documents_by_file[os.path.abspath(json_file.path)] = documents
                         
             except Exception as e:
-                logger.error(f"Error processing {json_file}: {e}")
-        
-        # Process PDF files
-        pdf_files = [f for f in os.listdir(data_directory) if f.endswith('.pdf')]
+                logger.error(f"Error processing {json_file.name}: {e}")
         
-        for pdf_file in pdf_files:
-            file_path = os.path.join(data_directory, pdf_file)
+        # Process JSON Lines files (one scraped item per line)
+        for jsonl_file in jsonl_files:
             try:
-                loader = PyPDFLoader(file_path)
-                pdf_documents = loader.load()
-                documents.extend(pdf_documents)
-                
+                documents = []
+                with open(jsonl_file.path, 'rb') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        data = orjson.loads(line)
+                        if isinstance(data, dict):
+                            documents.extend(self.extract_content_from_json(data))
+                documents_by_file[os.path.abspath(jsonl_file.path)] = documents
+                        
             except Exception as e:
-                logger.error(f"Error processing {pdf_file}: {e}")
+                logger.error(f"Error processing {jsonl_file.name}: {e}")
         
-        if documents:
-            # Split documents into chunks
-            texts = self.text_splitter.split_documents(documents)
-            
-            # Add to vector store
-            self.vectorstore.add_documents(texts)
-            self.vectorstore.persist()
+        # Process PDF files, parsing is CPU bound so spread it across processes.
+        # Embedding stays in this process with the loaded model.
+        if pdf_files:
+            # Ingestion can run on a thread next to torch training, and forking
+            # a multithreaded process can deadlock the children
+            with ProcessPoolExecutor(
+                max_workers=min(len(pdf_files), os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                futures = {executor.submit(_load_pdf, pdf_file.path): pdf_file for pdf_file in pdf_files}
+                for future in as_completed(futures):
+                    try:
+                        documents_by_file[os.path.abspath(futures[future].path)] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error processing {futures[future].name}: {e}")
+        
+        # Chunks of changed files that are gone now, and of deleted files
+        removed_files = [
+            path for path in cache
+            if os.path.dirname(path) == directory and path not in present
+        ]
+        
+        # Split documents into chunks, ids are content hashes so re-ingesting
+        # a chunk overwrites it instead of duplicating it
+        texts = []
+        chunk_ids_by_file = {}
+        for path, documents in documents_by_file.items():
+            chunks = self.text_splitter.split_documents(documents)
+            chunk_ids_by_file[path] = [_chunk_id(chunk) for chunk in chunks]
+            texts.extend(chunks)
+        
+        # Skip repeated boilerplate before paying for its embeddings
+        chunk_count = len(texts)
+        texts = _drop_near_duplicates(texts)
+        if len(texts) < chunk_count:
+            logger.info(f"Dropped {chunk_count - len(texts)} near-duplicate chunks")
+        kept_ids = {_chunk_id(text) for text in texts}
+        
+        stale_ids = set()
+        for path in removed_files:
+            stale_ids.update(cache.pop(path)["chunk_ids"])
+        for path, chunk_ids in chunk_ids_by_file.items():
+            if path in cache:
+                stale_ids.update(set(cache[path]["chunk_ids"]) - kept_ids)
+            cache[path] = {**file_stats[path], "chunk_ids": [i for i in chunk_ids if i in kept_ids]}
+        if stale_ids:
+            self.vectorstore._collection.delete(ids=list(stale_ids))
+        
+        if texts:
+            # Encode the chunks batch by batch and write them to the collection directly
+            for batch_number, start in enumerate(range(0, len(texts), CHROMA_ADD_BATCH_SIZE), 1):
+                batch = texts[start:start + CHROMA_ADD_BATCH_SIZE]
+                contents = [text.page_content for text in batch]
+                embeddings = self._encode_chunks(contents)
+                self.vectorstore._collection.upsert(
+                    ids=[_chunk_id(text) for text in batch],
+                    embeddings=embeddings.tolist(),
+                    metadatas=[text.metadata for text in batch],
+                    documents=contents
+                )
+                if batch_number % CHROMA_PERSIST_EVERY == 0:
+                    self.vectorstore.persist()
             
             logger.info(f"Ingested {len(texts)} document chunks into vector store")
-        else:
-            logger.warning("No documents found to ingest")
+        elif not stale_ids:
+            logger.info("No new or changed documents to ingest")
+        
+        if texts or stale_ids:
+            self.vectorstore.persist()
+        self._save_ingest_cache(cache)
+    
+    def _encode_chunks(self, contents: List[str]) -> np.ndarray:
+        """Encode chunk texts, reusing vectors from the embedding cache"""
+        def encode(texts):
+            return self.embeddings.client.encode(
+                texts,
+                batch_size=self.embed_batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+        
+        if self.embedding_cache is None:
+            return encode(contents)
+        
+        keys = [SqliteEmbedCache.make_key(self.embedding_model, content) for content in contents]
+        cached = self.embedding_cache.get_many(keys)
+        misses = [i for i, key in enumerate(keys) if key not in cached]
+        if misses:
+            encoded = encode([contents[i] for i in misses])
+            self.embedding_cache.put_many([(keys[i], vector) for i, vector in zip(misses, encoded)])
+            cached.update((keys[i], vector) for i, vector in zip(misses, encoded))
+        return np.stack([cached[key] for key in keys])
+    
+    def _ingest_cache_path(self) -> str:
+        # Stored with the vector store so the two are reset together
+        return os.path.join(self.persist_directory, "ingest_cache.json")
+    
+    def _load_ingest_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Load the per-file stats and chunk ids of the last ingest"""
+        try:
+            with open(self._ingest_cache_path(), 'rb') as f:
+                return orjson.loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"Ignoring corrupt ingest cache: {e}")
+            return {}
+    
+    def _save_ingest_cache(self, cache: Dict[str, Dict[str, Any]]):
+        """Atomically replace the ingest cache"""
+        path = self._ingest_cache_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(orjson.dumps(cache))
+        os.replace(f"{path}.tmp", path)
     
     def extract_content_from_json(self, data: Dict[str, Any]) -> List[Any]:
         """Extract content from JSON data structure"""
-        from langchain.schema import Document
-        
         documents = []
         
         # Main content
@@ -248,21 +528,25 @@ class RAGSystem:
         if not headers or not rows:
             return ""
         
-        content = "Table Data:\n"
-        content += " | ".join(headers) + "\n"
-        content += "-" * (len(" | ".join(headers))) + "\n"
-        
-        for row in rows:
-            if len(row) == len(headers):
-                content += " | ".join(str(cell) for cell in row) + "\n"
+        header_line = " | ".join(headers)
+        lines = ["Table Data:", header_line, "-" * len(header_line)]
+        lines.extend(" | ".join(map(str, row)) for row in rows if len(row) == len(headers))
+        lines.append("")
         
-        return content
+        return "\n".join(lines)
+    
+    @cachedmethod(lambda self: self._query_embedding_cache,
+                  lock=lambda self: self._query_embedding_cache_lock)
+    def encode_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the vector for recently seen queries"""
+        return self.embeddings.embed_query(query)
     
     def generate_response(self, 
                          query: str, 
                          intent: str = "general",
                          entities: List[Dict[str, Any]] = None,
-                         context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                         context: Optional[Dict[str, Any]] = None,
+                         query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
         """Generate response using RAG approach"""
         
         if not self.vectorstore:
@@ -276,7 +560,9 @@ class RAGSystem:
         
         try:
             # Retrieve relevant documents
-            relevant_docs = self.retriever.get_relevant_documents(query)
+            if query_embedding is None:
+                query_embedding = self.encode_query(query)
+            relevant_docs = self.vectorstore.similarity_search_by_vector(query_embedding, k=5)
             
             if not relevant_docs:
                 return {
@@ -326,7 +612,8 @@ class RAGSystem:
         # In production, this would use an actual LLM
         
         # Extract key information from context
-        context_snippets = context.split('\n\n')[:3]  # Use first 3 most relevant snippets
+        # Use first 3 most relevant snippets, without splitting the rest of the context
+        context_snippets = context.split('\n\n', 3)[:3]
         
         # Create a structured response based on intent and entities
         if entities:
@@ -338,8 +625,9 @@ class RAGSystem:
         # Combine context snippets into a coherent response
         response_parts = []
         for snippet in context_snippets:
-            if len(snippet.strip()) > 50:  # Only include substantial content
-                response_parts.append(snippet.strip()[:500])  # Limit length
+            snippet = snippet.strip()
+            if len(snippet) > 50:  # Only include substantial content
+                response_parts.append(snippet[:500])  # Limit length
         
         if response_parts:
             main_response = entity_info + "\n\n".join(response_parts)
@@ -348,14 +636,17 @@ class RAGSystem:
         
         return main_response
     
-    def search_similar_documents(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    def search_similar_documents(self, query: str, k: int = 5,
+                                 query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """Search for similar documents"""
         if not self.vectorstore:
             self.initialize_vectorstore()
             return []
         
         try:
-            docs = self.vectorstore.similarity_search(query, k=k)
+            if query_embedding is None:
+                query_embedding = self.encode_query(query)
+            docs = self.vectorstore.similarity_search_by_vector(query_embedding, k=k)
             
             results = []
             for doc in docs:
@@ -6,38 +6,238 @@ This script orchestrates the entire ML pipeline from data ingestion to model dep
 
 import os
 import sys
+import hashlib
 import logging
+import logging.handlers
 import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from itertools import islice
 from pathlib import Path
 
+import numpy as np
+import orjson
+
 # Add backend to Python path
 sys.path.append(str(Path(__file__).parent))
 
-from data_ingestion.web_scraper import DataIngestionPipeline
-from ml_models.intent_classifier import IntentClassificationPipeline
-from ml_models.ner_model import MOSDACNERModel, EntityRelationshipExtractor
-from knowledge_graph.graph_builder import KnowledgeGraphBuilder
-from rag.retrieval_system import RAGSystem
+# The scraper, models, graph and RAG modules pull in scrapy, torch,
+# transformers, spaCy, neo4j and chromadb, so they are imported where they
+# are first used and a single step only pays for what it runs
+from cache import notify_graph_updated
 from config import settings
 
-# Configure logging
+# Configure logging. File writes are buffered and go out in batches, or
+# straight away on an error; logging flushes the rest at interpreter exit.
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+_log_file = logging.FileHandler('pipeline.log')
+_log_file.setFormatter(logging.Formatter(LOG_FORMAT))
+_file_log_handler = logging.handlers.MemoryHandler(capacity=1024, target=_log_file)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('pipeline.log'),
+        _file_log_handler,
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Models owned by each extraction worker process, see _init_extract_worker
+_worker_ner_model = None
+_worker_relationship_extractor = None
+
+def _physical_cores() -> list:
+    """One usable CPU per physical core, or every usable CPU if unknown"""
+    if not hasattr(os, "sched_getaffinity"):
+        return []
+    allowed = sorted(os.sched_getaffinity(0))
+    cores = []
+    for cpu in allowed:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                first_sibling = int(f.read().replace("-", ",").split(",")[0])
+        except (OSError, ValueError):
+            return allowed
+        if first_sibling == cpu:
+            cores.append(cpu)
+    return cores or allowed
+
+def _init_extract_worker(worker_counter=None, cores=()):
+    """Load CPU-only extraction models once per worker process"""
+    from ml_models.ner_model import MOSDACNERModel, EntityRelationshipExtractor
+    
+    global _worker_ner_model, _worker_relationship_extractor
+    
+    # Pin each worker to its own physical core so it keeps its caches warm
+    # instead of migrating between hyperthreads
+    if worker_counter is not None and cores:
+        with worker_counter.get_lock():
+            worker_index = worker_counter.value
+            worker_counter.value += 1
+        os.sched_setaffinity(0, {cores[worker_index % len(cores)]})
+    
+    _worker_ner_model = MOSDACNERModel(batch_size=settings.NER_BATCH_SIZE)
+    if os.path.exists(settings.NER_MODEL_PATH):
+        _worker_ner_model.load_model(settings.NER_MODEL_PATH)
+    _worker_relationship_extractor = EntityRelationshipExtractor(_worker_ner_model)
+
+def _content_batches(processed_data, size: int):
+    """Group the non-empty document contents into lists of up to size"""
+    contents = (doc['content'] for doc in processed_data if doc.get('content'))
+    while batch := list(islice(contents, size)):
+        yield batch
+
+def _extract_docs(contents):
+    """Extract entities and relationships for a batch of documents in a worker"""
+    entity_batches = _worker_ner_model.extract_entities_soa_batch(contents)
+    relationships_batch = [
+        _worker_relationship_extractor.extract_relationships(content)
+        for content in contents
+    ]
+    return entity_batches, relationships_batch
+
+def _latest_mtime(path: str):
+    """Newest modification time of a file or of anything under a directory"""
+    if not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    for root, _, files in os.walk(path):
+        mtime = max([mtime, os.stat(root).st_mtime_ns,
+                     *(os.stat(os.path.join(root, name)).st_mtime_ns for name in files)])
+    return mtime
+
+def _source_digest() -> str:
+    """Hash of the backend source, so code changes invalidate saved test results"""
+    digest = hashlib.sha1()
+    backend_dir = Path(__file__).parent
+    for path in sorted(backend_dir.rglob('*.py')):
+        digest.update(str(path.relative_to(backend_dir)).encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+# Written next to a trained model, holding the hash of its training data
+TRAINING_DATA_HASH_FILE = ".data_hash"
+
+def _training_data_hash(training_data) -> str:
+    return hashlib.sha256(orjson.dumps(training_data)).hexdigest()
+
+def _is_trained_on(model_path: str, data_hash: str) -> bool:
+    """Whether the model saved at model_path was trained on data with this hash"""
+    try:
+        with open(os.path.join(model_path, TRAINING_DATA_HASH_FILE)) as f:
+            return f.read().strip() == data_hash
+    except OSError:
+        return False
+
+def _mark_trained_on(model_path: str, data_hash: str):
+    with open(os.path.join(model_path, TRAINING_DATA_HASH_FILE), 'w') as f:
+        f.write(data_hash)
+
+def _count_unique(seen, records, key):
+    """Keep the first record per key, counting how often each key occurs"""
+    for record in records:
+        k = key(record)
+        canonical = seen.get(k)
+        if canonical is None:
+            seen[k] = {**record, "frequency": 1}
+        else:
+            canonical["frequency"] += 1
+
+def _count_unique_entities(seen, entity_batches):
+    """Fold the per-document EntityBatches of one batch into seen, keyed like
+    _count_unique on (casefolded text, label), deduplicating the batch's
+    columns with numpy before touching the dict"""
+    texts = [text for batch in entity_batches for text in batch.texts]
+    if not texts:
+        return
+    # Every batch from one model shares its label table
+    label_names = entity_batches[0].label_names
+    labels = np.concatenate([batch.labels for batch in entity_batches]).astype(np.int64)
+    starts = np.concatenate([batch.starts for batch in entity_batches])
+    ends = np.concatenate([batch.ends for batch in entity_batches])
+    confidences = np.concatenate([batch.confidences for batch in entity_batches])
+    
+    folded = np.array([text.casefold() for text in texts], dtype=object)
+    _, text_ids = np.unique(folded, return_inverse=True)
+    _, first, counts = np.unique(
+        text_ids * len(label_names) + labels, return_index=True, return_counts=True
+    )
+    
+    for i, count in zip(first.tolist(), counts.tolist()):
+        label = label_names[labels[i]]
+        canonical = seen.get((folded[i], label))
+        if canonical is None:
+            seen[(folded[i], label)] = {
+                "text": texts[i],
+                "label": label,
+                "start": int(starts[i]),
+                "end": int(ends[i]),
+                "confidence": float(confidences[i]),
+                "frequency": count
+            }
+        else:
+            canonical["frequency"] += count
+
+def _relationship_key(relationship):
+    return relationship['subject'].casefold(), relationship['predicate'], relationship['object'].casefold()
+
 class MOSDACMLPipeline:
-    def __init__(self):
-        self.data_pipeline = DataIngestionPipeline(settings.SCRAPED_DATA_DIR)
-        self.intent_classifier = IntentClassificationPipeline()
-        self.ner_model = MOSDACNERModel()
+    def __init__(self, workers: int = 1, precision: str = settings.INFERENCE_DTYPE,
+                 force_train: bool = False, use_test_cache: bool = True):
+        self.workers = workers
+        self.precision = precision
+        self.force_train = force_train
+        self.use_test_cache = use_test_cache
         self.graph_builder = None
-        self.rag_system = RAGSystem(persist_directory=settings.CHROMA_PERSIST_DIRECTORY)
+        
+        # Memoized per-query responses for test_system
+        self._generate_response = lru_cache(maxsize=1024)(self._generate_response_uncached)
+    
+    # Subsystems are created on first use, so a single step only loads the
+    # models it needs
+    
+    @cached_property
+    def data_pipeline(self):
+        from data_ingestion.web_scraper import DataIngestionPipeline
+        return DataIngestionPipeline(
+            settings.SCRAPED_DATA_DIR,
+            concurrency=settings.MAX_CONCURRENT_REQUESTS,
+            crawl_delay=settings.CRAWL_DELAY,
+            aggressive=settings.CRAWL_AGGRESSIVE
+        )
+    
+    @cached_property
+    def ner_model(self):
+        from ml_models.ner_model import MOSDACNERModel
+        return MOSDACNERModel(batch_size=settings.NER_BATCH_SIZE)
+    
+    @cached_property
+    def rag_system(self):
+        from rag.retrieval_system import RAGSystem, SqliteEmbedCache
+        rag_system = RAGSystem(
+            embedding_model=settings.EMBEDDING_MODEL,
+            persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
+            embed_batch_size=settings.EMBED_BATCH_SIZE,
+            embedding_dtype=self.precision
+        )
+        # Re-runs only embed chunks whose text has not been seen before
+        rag_system.embedding_cache = SqliteEmbedCache(settings.EMBEDDING_CACHE_PATH)
+        return rag_system
+    
+    @cached_property
+    def intent_classifier(self):
+        from ml_models.intent_classifier import IntentClassificationPipeline, EmbeddingIntentClassifier
+        if settings.INTENT_BACKEND == "embedding":
+            # Shares the RAG encoder instead of loading a second transformer
+            return EmbeddingIntentClassifier(embedder=self.rag_system.embeddings.client)
+        return IntentClassificationPipeline(dtype=self.precision)
+    
+    def _generate_response_uncached(self, query: str, intent: str, entity_texts: tuple):
+        # Template responses only read the entity texts
+        entities = [{'text': text} for text in entity_texts]
+        return self.rag_system.generate_response(query, intent, entities)
         
     def run_data_ingestion(self):
         """Step 1: Scrape and process web content"""
@@ -51,33 +251,51 @@ class MOSDACMLPipeline:
         logger.info("Running web scraper...")
         self.data_pipeline.run_scraper()
         
-        # Process scraped data
-        logger.info("Processing scraped data...")
-        processed_data = self.data_pipeline.process_scraped_data()
-        
-        logger.info(f"Data ingestion completed. Processed {len(processed_data)} documents.")
-        return processed_data
+        # Scraped items are streamed from disk when the graph is built, so they
+        # are never all held in memory
+        logger.info("Data ingestion completed.")
+        return self.data_pipeline.process_scraped_data()
     
     def train_ml_models(self):
         """Step 2: Train ML models"""
         logger.info("Starting ML model training...")
+        from ml_models.intent_classifier import EmbeddingIntentClassifier, create_training_data
         
-        # Train intent classifier
-        logger.info("Training intent classifier...")
-        df = self.intent_classifier.create_training_data()
-        train_dataset, val_dataset = self.intent_classifier.prepare_data(df)
-        self.intent_classifier.train_model(train_dataset, val_dataset, settings.INTENT_MODEL_PATH)
+        # Saved models are reused unless their training data has changed
+        df = create_training_data()
+        if isinstance(self.intent_classifier, EmbeddingIntentClassifier):
+            # Fitting only embeds the examples, and nothing is saved to reuse
+            logger.info("Training intent classifier...")
+            self.intent_classifier.fit(df)
+        else:
+            intent_hash = _training_data_hash(df.to_dict('list'))
+            if not self.force_train and _is_trained_on(settings.INTENT_MODEL_PATH, intent_hash):
+                logger.info("Intent training data unchanged, loading saved intent classifier")
+                self.intent_classifier.load_model(settings.INTENT_MODEL_PATH)
+            else:
+                logger.info("Training intent classifier...")
+                self.intent_classifier.train_head(df, settings.INTENT_MODEL_PATH)
+                _mark_trained_on(settings.INTENT_MODEL_PATH, intent_hash)
         
-        # Train NER model
-        logger.info("Training NER model...")
         training_data = self.ner_model.create_training_data()
-        self.ner_model.train_model(training_data, output_dir=settings.NER_MODEL_PATH)
+        ner_hash = _training_data_hash(training_data)
+        if not self.force_train and _is_trained_on(settings.NER_MODEL_PATH, ner_hash):
+            logger.info("NER training data unchanged, loading saved NER model")
+            self.ner_model.load_model(settings.NER_MODEL_PATH)
+        else:
+            logger.info("Training NER model...")
+            self.ner_model.train_model(
+                training_data, output_dir=settings.NER_MODEL_PATH, use_gpu=settings.NER_TRAIN_GPU
+            )
+            _mark_trained_on(settings.NER_MODEL_PATH, ner_hash)
         
         logger.info("ML model training completed.")
     
     def build_knowledge_graph(self, processed_data):
         """Step 3: Build knowledge graph"""
         logger.info("Building knowledge graph...")
+        from knowledge_graph.graph_builder import KnowledgeGraphBuilder, GraphQueryEngine
+        from ml_models.ner_model import EntityRelationshipExtractor
         
         # Initialize graph builder
         self.graph_builder = KnowledgeGraphBuilder(
@@ -86,28 +304,64 @@ class MOSDACMLPipeline:
             neo4j_password=settings.NEO4J_PASSWORD
         )
         
-        # Extract entities and relationships from processed data
-        all_entities = []
-        all_relationships = []
+        # Extract entities and relationships from processed data, keeping
+        # one record per distinct entity and relationship
+        seen_entities = {}
+        seen_relationships = {}
         
         relationship_extractor = EntityRelationshipExtractor(self.ner_model)
         
-        for doc in processed_data:
-            content = doc.get('content', '')
-            if content:
-                # Extract entities
-                entities = self.ner_model.extract_entities(content)
-                all_entities.extend(entities)
+        # Extract entities in batched pipeline passes while streaming the documents
+        batches = _content_batches(processed_data, settings.NER_BATCH_SIZE)
+        document_count = 0
+        
+        if self.workers > 1:
+            # Spawned workers load their own CPU models from the saved NER model
+            # instead of inheriting CUDA or tokenizer state through a fork.
+            # Each worker gets one core, so keep BLAS from starting a thread
+            # per core in every worker; spawned children inherit this.
+            for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+                os.environ.setdefault(var, "1")
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=mp_context,
+                initializer=_init_extract_worker,
+                initargs=(mp_context.Value('i', 0), _physical_cores())
+            ) as executor:
+                for entity_batches, relationships_batch in executor.map(_extract_docs, batches):
+                    document_count += len(entity_batches)
+                    _count_unique_entities(seen_entities, entity_batches)
+                    for relationships in relationships_batch:
+                        _count_unique(seen_relationships, relationships, _relationship_key)
+        else:
+            for contents in batches:
+                document_count += len(contents)
+                
+                # Entities stay as per-document column arrays until they are
+                # deduplicated, instead of becoming a dict per mention
+                _count_unique_entities(seen_entities, self.ner_model.extract_entities_soa_batch(contents))
                 
-                # Extract relationships
-                relationships = relationship_extractor.extract_relationships(content)
-                all_relationships.extend(relationships)
+                for content in contents:
+                    relationships = relationship_extractor.extract_relationships(content)
+                    _count_unique(seen_relationships, relationships, _relationship_key)
+        
+        logger.info(f"Extracted entities from {document_count} documents.")
+        
+        all_entities = list(seen_entities.values())
+        all_relationships = list(seen_relationships.values())
         
         # Build and save knowledge graph
         self.graph_builder.build_graph_from_entities(all_entities, all_relationships)
-        self.graph_builder.save_to_neo4j()
+        self.graph_builder.save_to_neo4j(batch_size=settings.NEO4J_BATCH_SIZE)
+        
+        # Rebuild the entity ANN index so it matches the new graph
+        GraphQueryEngine(self.graph_builder).build_ann_index(
+            self.rag_system.embeddings.client, settings.KG_INDEX_PATH, rebuild=True
+        )
+        notify_graph_updated(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB)
         
-        logger.info(f"Knowledge graph built with {len(all_entities)} entities and {len(all_relationships)} relationships.")
+        logger.info(f"Knowledge graph built with {len(all_entities)} unique entities and {len(all_relationships)} unique relationships.")
     
     def setup_rag_system(self):
         """Step 4: Setup RAG system"""
@@ -130,14 +384,8 @@ class MOSDACMLPipeline:
             # Step 1: Data ingestion
             processed_data = self.run_data_ingestion()
             
-            # Step 2: Train ML models
-            self.train_ml_models()
-            
-            # Step 3: Build knowledge graph
-            self.build_knowledge_graph(processed_data)
-            
-            # Step 4: Setup RAG system
-            self.setup_rag_system()
+            # Steps 2-4: Train models, build the graph and set up RAG
+            self.run_model_stages(processed_data)
             
             logger.info("Complete ML pipeline executed successfully!")
             
@@ -151,6 +399,27 @@ class MOSDACMLPipeline:
         finally:
             if self.graph_builder:
                 self.graph_builder.close()
+            _file_log_handler.flush()
+    
+    def run_model_stages(self, processed_data):
+        """Run steps 2-4, setting up RAG alongside training and the graph build"""
+        # RAG ingestion reads the scraped files itself and needs neither the
+        # trained models nor the graph. Encoding and Chroma writes release the
+        # GIL, so a background thread overlaps them with the other stages.
+        # The RAG system is created up front because the embedding intent
+        # backend shares it, and cached_property does not lock.
+        self.rag_system
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-setup") as executor:
+            rag_setup = executor.submit(self.setup_rag_system)
+            
+            # Step 2: Train ML models
+            self.train_ml_models()
+            
+            # Step 3: Build knowledge graph, which needs the trained NER model
+            self.build_knowledge_graph(processed_data)
+            
+            # Step 4: Setup RAG system
+            rag_setup.result()
     
     def test_system(self):
         """Test the complete system"""
@@ -164,26 +433,65 @@ class MOSDACMLPipeline:
             "API documentation for bulk access"
         ]
         
-        for query in test_queries:
+        # Replay the saved results while the queries, code, settings, trained
+        # models and vector store they ran against are all unchanged
+        cache_path = self._test_cache_path(test_queries)
+        if self.use_test_cache and os.path.exists(cache_path):
+            logger.info(f"Replaying test results from {cache_path}")
+            with open(cache_path, 'rb') as f:
+                results = orjson.loads(f.read())
+        else:
+            results = self._run_test_queries(test_queries)
+            os.makedirs(settings.TEST_CACHE_DIR, exist_ok=True)
+            with open(cache_path, 'wb') as f:
+                f.write(orjson.dumps(results))
+        
+        for result in results:
+            query, intent, confidence = result['query'], result['intent'], result['confidence']
+            entity_texts, response = result['entities'], result['response']
             logger.info(f"Testing query: {query}")
-            
-            # Test intent classification
-            intent, confidence = self.intent_classifier.predict_intent(query)
             logger.info(f"  Intent: {intent} (confidence: {confidence:.2f})")
-            
-            # Test entity extraction
-            entities = self.ner_model.extract_entities(query)
-            logger.info(f"  Entities: {[e['text'] for e in entities]}")
-            
-            # Test RAG response
-            response = self.rag_system.generate_response(query, intent, entities)
+            logger.info(f"  Entities: {entity_texts}")
             logger.info(f"  Response length: {len(response['response'])} characters")
             
             print(f"\nQuery: {query}")
             print(f"Intent: {intent} ({confidence:.2f})")
-            print(f"Entities: {[e['text'] for e in entities]}")
+            print(f"Entities: {entity_texts}")
             print(f"Response: {response['response'][:200]}...")
             print("-" * 80)
+    
+    def _test_cache_path(self, test_queries) -> str:
+        """Cache file for the test results of these queries against the current models"""
+        key = orjson.dumps([
+            test_queries,
+            _source_digest(),
+            settings.model_dump(),
+            self.precision,
+            _latest_mtime(settings.INTENT_MODEL_PATH),
+            _latest_mtime(settings.NER_MODEL_PATH),
+            _latest_mtime(settings.CHROMA_PERSIST_DIRECTORY)
+        ])
+        return os.path.join(settings.TEST_CACHE_DIR, f"{hashlib.sha1(key).hexdigest()}.json")
+    
+    def _run_test_queries(self, test_queries):
+        # Classify intents and extract entities for all queries in one batch each
+        intents = self.intent_classifier.predict_intent_batch(test_queries)
+        entities_batch = self.ner_model.extract_entities_batch(test_queries)
+        
+        results = []
+        for query, (intent, confidence), entities in zip(test_queries, intents, entities_batch):
+            # Test RAG response
+            entity_texts = tuple(e['text'] for e in entities)
+            response = self._generate_response(query, intent, entity_texts)
+            
+            results.append({
+                "query": query,
+                "intent": intent,
+                "confidence": float(confidence),
+                "entities": list(entity_texts),
+                "response": response
+            })
+        return results
 
 def main():
     parser = argparse.ArgumentParser(description="MOSDAC ML Pipeline Runner")
@@ -191,10 +499,22 @@ def main():
                        default="full", help="Pipeline step to run")
     parser.add_argument("--skip-scraping", action="store_true", 
                        help="Skip web scraping (use existing data)")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Processes for knowledge graph extraction")
+    parser.add_argument("--precision", choices=["float32", "float16", "bfloat16"],
+                       default=settings.INFERENCE_DTYPE,
+                       help="Inference dtype for the transformer models (float16 falls back to bfloat16 on CPU)")
+    parser.add_argument("--force-train", action="store_true",
+                       help="Retrain models even if their training data is unchanged")
+    parser.add_argument("--no-test-cache", action="store_true", default=bool(os.environ.get("CI")),
+                       help="Always run the test queries instead of replaying saved results (default under CI)")
     
     args = parser.parse_args()
     
-    pipeline = MOSDACMLPipeline()
+    pipeline = MOSDACMLPipeline(
+        workers=args.workers, precision=args.precision, force_train=args.force_train,
+        use_test_cache=not args.no_test_cache
+    )
     
     try:
         if args.step == "data":
@@ -213,9 +533,7 @@ def main():
             if args.skip_scraping:
                 # Skip scraping, use existing data
                 processed_data = pipeline.data_pipeline.process_scraped_data()
-                pipeline.train_ml_models()
-                pipeline.build_knowledge_graph(processed_data)
-                pipeline.setup_rag_system()
+                pipeline.run_model_stages(processed_data)
                 pipeline.test_system()
             else:
                 pipeline.run_full_pipeline()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from api.batching import BatchProcessor
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def _submit_all(processor, texts):
+    processor.start()
+    try:
+        return await asyncio.gather(
+            *(processor.submit(text) for text in texts), return_exceptions=True
+        )
+    finally:
+        await processor.stop()
+
+def test_concurrent_requests_share_one_batch():
+    calls = []
+
+    def batch_fn(texts):
+        calls.append(list(texts))
+        return [text.upper() for text in texts]
+
+    processor = BatchProcessor(batch_fn, max_batch_size=8, max_wait_ms=50)
+    results = run(_submit_all(processor, ["a", "b", "c"]))
+
+    assert results == ["A", "B", "C"]
+    assert calls == [["a", "b", "c"]]
+
+def test_batches_are_capped_at_max_batch_size():
+    calls = []
+
+    def batch_fn(texts):
+        calls.append(len(texts))
+        return texts
+
+    processor = BatchProcessor(batch_fn, max_batch_size=2, max_wait_ms=50)
+    results = run(_submit_all(processor, ["a", "b", "c", "d", "e"]))
+
+    assert results == ["a", "b", "c", "d", "e"]
+    assert max(calls) <= 2
+    assert sum(calls) == 5
+
+def test_batch_errors_fail_every_request_in_the_batch():
+    def batch_fn(texts):
+        raise ValueError("model failed")
+
+    processor = BatchProcessor(batch_fn, max_batch_size=8, max_wait_ms=50)
+    results = run(_submit_all(processor, ["a", "b"]))
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_short_results_fail_the_requests_left_over():
+    def batch_fn(texts):
+        return [text.upper() for text in texts[:1]]
+
+    processor = BatchProcessor(batch_fn, max_batch_size=8, max_wait_ms=50)
+    results = run(asyncio.wait_for(_submit_all(processor, ["a", "b", "c"]), timeout=5))
+
+    assert results[0] == "A"
+    assert all(isinstance(result, RuntimeError) for result in results[1:])
+
+def test_submit_requires_a_running_processor():
+    processor = BatchProcessor(lambda texts: texts)
+
+    with pytest.raises(RuntimeError):
+        run(processor.submit("a"))
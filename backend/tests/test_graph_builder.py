@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("neo4j")
+pytest.importorskip("faiss")
+pytest.importorskip("cachetools")
+
+from knowledge_graph.graph_builder import KnowledgeGraphBuilder
+
+@pytest.fixture
+def graph_builder():
+    # Nothing listens on this port, so index creation fails fast and is skipped
+    builder = KnowledgeGraphBuilder("bolt://127.0.0.1:1", "neo4j", "password")
+    yield builder
+    builder.close()
+
+def test_staged_node_keeps_the_mapped_entity_type(graph_builder):
+    entity = graph_builder.create_entity("INSAT-3D", "SATELLITE")
+
+    graph_builder.add_entity_to_graph(entity)
+
+    node = graph_builder._nodes[-1]
+    assert node["type"] == "Mission"
+    assert node["label"] == "INSAT-3D"
+    assert node["id"] == entity.id
+
+def test_staged_node_keeps_unmapped_labels(graph_builder):
+    entity = graph_builder.create_entity("somewhere", "UNKNOWN_LABEL")
+
+    graph_builder.add_entity_to_graph(entity)
+
+    assert graph_builder._nodes[-1]["type"] == "UNKNOWN_LABEL"
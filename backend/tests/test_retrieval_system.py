@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("chromadb")
+pytest.importorskip("torch")
+
+from langchain.schema import Document
+
+from rag.retrieval_system import SIMHASH_MAX_DISTANCE, _drop_near_duplicates, _simhash64
+
+BASE_TEXT = " ".join(
+    f"INSAT-3D imager channel {i} provides radiance data over the Indian Ocean region"
+    for i in range(10)
+)
+UNRELATED_TEXT = "Scatterometer wind vectors are available through the bulk API download service"
+
+def _distance(a: str, b: str) -> int:
+    return (_simhash64(a) ^ _simhash64(b)).bit_count()
+
+def test_simhash_ignores_case_punctuation_and_word_order():
+    assert _simhash64("Hello, World!") == _simhash64("hello world")
+    assert _simhash64("a b c") == _simhash64("c b a")
+
+def test_simhash_keeps_small_edits_close_and_unrelated_texts_apart():
+    edited = BASE_TEXT.replace("channel 7", "channel seven")
+
+    assert _distance(BASE_TEXT, edited) <= SIMHASH_MAX_DISTANCE
+    assert _distance(BASE_TEXT, UNRELATED_TEXT) > SIMHASH_MAX_DISTANCE
+
+def test_drop_near_duplicates_keeps_the_first_of_each_group_in_order():
+    first = Document(page_content=BASE_TEXT, metadata={"source": "a"})
+    near_copy = Document(page_content=BASE_TEXT.replace("channel 7", "channel seven"), metadata={"source": "b"})
+    other = Document(page_content=UNRELATED_TEXT, metadata={"source": "c"})
+
+    kept = _drop_near_duplicates([first, other, near_copy])
+
+    assert [doc.metadata["source"] for doc in kept] == ["a", "c"]
+
+def test_drop_near_duplicates_honours_max_distance():
+    same = [Document(page_content=BASE_TEXT), Document(page_content=BASE_TEXT.upper())]
+    different = [Document(page_content=BASE_TEXT), Document(page_content=UNRELATED_TEXT)]
+
+    assert len(_drop_near_duplicates(same, max_distance=0)) == 1
+    assert len(_drop_near_duplicates(different, max_distance=0)) == 2
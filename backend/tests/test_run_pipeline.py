@@ -0,0 +1,77 @@
+import importlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("redis")
+
+@pytest.fixture(scope="module")
+def run_pipeline(tmp_path_factory):
+    # Importing the runner opens pipeline.log in the working directory
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp("pipeline"))
+        return importlib.import_module("run_pipeline")
+
+class _EntityBatch:
+    """Same columns as ml_models.ner_model.EntityBatch, without loading spaCy"""
+
+    def __init__(self, entities, label_names):
+        self.texts = [text for text, _, _ in entities]
+        self.labels = np.array([label_names.index(label) for _, label, _ in entities], dtype=np.int16)
+        self.starts = np.array([start for _, _, start in entities], dtype=np.int32)
+        self.ends = self.starts + np.array([len(text) for text in self.texts], dtype=np.int32)
+        self.confidences = np.ones(len(entities), dtype=np.float32)
+        self.label_names = label_names
+
+def test_count_unique_entities_counts_case_insensitive_mentions_per_label(run_pipeline):
+    label_names = ["SATELLITE", "ORGANIZATION"]
+    batches = [
+        _EntityBatch([("INSAT-3D", "SATELLITE", 0), ("ISRO", "ORGANIZATION", 20)], label_names),
+        _EntityBatch([("insat-3d", "SATELLITE", 5), ("INSAT-3D", "ORGANIZATION", 9)], label_names),
+        _EntityBatch([], label_names),
+    ]
+    seen = {}
+
+    run_pipeline._count_unique_entities(seen, batches)
+
+    assert seen[("insat-3d", "SATELLITE")]["frequency"] == 2
+    # The first mention is kept as the canonical record
+    assert seen[("insat-3d", "SATELLITE")]["text"] == "INSAT-3D"
+    assert seen[("insat-3d", "SATELLITE")]["start"] == 0
+    assert seen[("insat-3d", "ORGANIZATION")]["frequency"] == 1
+    assert seen[("isro", "ORGANIZATION")]["frequency"] == 1
+    assert len(seen) == 3
+
+def test_count_unique_entities_accumulates_across_calls(run_pipeline):
+    label_names = ["SATELLITE"]
+    seen = {}
+
+    run_pipeline._count_unique_entities(seen, [_EntityBatch([("SCATSAT-1", "SATELLITE", 0)], label_names)])
+    run_pipeline._count_unique_entities(seen, [_EntityBatch([("Scatsat-1", "SATELLITE", 3)] * 2, label_names)])
+
+    assert seen == {
+        ("scatsat-1", "SATELLITE"): {
+            "text": "SCATSAT-1",
+            "label": "SATELLITE",
+            "start": 0,
+            "end": 9,
+            "confidence": 1.0,
+            "frequency": 3,
+        }
+    }
+
+def test_count_unique_entities_ignores_batches_without_entities(run_pipeline):
+    seen = {}
+
+    run_pipeline._count_unique_entities(seen, [_EntityBatch([], ["SATELLITE"])])
+
+    assert seen == {}
+
+def test_count_unique_entities_handles_more_than_127_labels(run_pipeline):
+    label_names = [f"LABEL_{i}" for i in range(200)]
+    seen = {}
+
+    run_pipeline._count_unique_entities(seen, [_EntityBatch([("ISRO", "LABEL_150", 0)], label_names)])
+
+    assert seen[("isro", "LABEL_150")]["label"] == "LABEL_150"
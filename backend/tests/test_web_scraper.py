@@ -0,0 +1,42 @@
+import hashlib
+
+import pytest
+
+pytest.importorskip("scrapy")
+pytest.importorskip("selectolax")
+pytest.importorskip("pypdfium2")
+
+from data_ingestion.web_scraper import BloomURLDupeFilter
+
+class _UrlFingerprinter:
+    """Stands in for Scrapy's request fingerprinter, requests are plain URLs here"""
+
+    def fingerprint(self, request):
+        return hashlib.sha1(request.encode("utf-8")).digest()
+
+def _dupe_filter(**kwargs):
+    return BloomURLDupeFilter(_UrlFingerprinter(), **kwargs)
+
+def test_first_request_is_new_and_repeat_is_seen():
+    dupe_filter = _dupe_filter()
+
+    assert not dupe_filter.request_seen("https://www.mosdac.gov.in/faq")
+    assert dupe_filter.request_seen("https://www.mosdac.gov.in/faq")
+
+def test_distinct_requests_are_not_reported_as_seen():
+    dupe_filter = _dupe_filter(capacity=1000, error_rate=0.001)
+    urls = [f"https://www.mosdac.gov.in/page/{i}" for i in range(1000)]
+
+    false_positives = sum(dupe_filter.request_seen(url) for url in urls)
+
+    # Expected about one at this capacity and error rate
+    assert false_positives <= 5
+    assert all(dupe_filter.request_seen(url) for url in urls)
+
+def test_filter_is_sized_from_capacity_and_error_rate():
+    small = _dupe_filter(capacity=1000, error_rate=0.01)
+    large = _dupe_filter(capacity=100000, error_rate=0.001)
+
+    assert len(small.bits) * 8 >= small.num_bits
+    assert large.num_bits > small.num_bits
+    assert large.num_hashes > small.num_hashes